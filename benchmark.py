@@ -0,0 +1,243 @@
+import argparse
+import importlib.metadata
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import neat
+import pygame
+
+import main_two_enemies
+import main_visualize
+from evaluation import EpisodeBudget, new_episodes, run_episode, aggregate_fitness, set_num_inputs
+from main import positive_int
+from profiling import PhaseTimer, NullTimer
+from sensors import SENSOR_SIZE
+from simulation import observation_size
+
+
+SCENARIOS = ["single", "sensors", "two_enemies", "visualize"]
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config-feedforward.txt")
+
+
+# ---------------- Benchmark cases ---------------- #
+# One case is a scenario at a population size and enemy count, run for a
+# fixed number of generations with every episode capped at a fixed number of
+# frames. Each case runs in its own process so its peak RSS is its own, and
+# seeds random / numpy first, so the same case simulates the same episodes
+# on every commit.
+#
+#   single       main.py headless path (batched network, struct-of-arrays world)
+#   sensors      single with the frame sensors (gap and ray-cast inputs) attached
+#   two_enemies  main_two_enemies.py headless, 4-direction moves and a reward
+#   visualize    main_visualize.py with the network view, drawn uncapped
+#                (on the dummy video driver unless a display is set up)
+class FrameCounter(NullTimer):
+    # Counts genome-frames without timing phases
+    def __init__(self):
+        self.frames = 0
+        self.totals = {}
+
+    def count(self, genome_frames):
+        self.frames += genome_frames
+
+
+def scenario_config(scenario, pop_size, n_enemies):
+    # The shipped config with the population size and the network shape the
+    # scenario needs for n_enemies
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet,
+                         neat.DefaultStagnation, CONFIG_PATH)
+    if scenario == "two_enemies":
+        num_inputs, num_outputs = 4 + 2 * n_enemies, 4
+    elif scenario == "sensors":
+        num_inputs, num_outputs = observation_size(n_enemies) + SENSOR_SIZE, 2
+    else:
+        num_inputs, num_outputs = observation_size(n_enemies), 2
+
+    set_num_inputs(config, num_inputs)
+    genome_config = config.genome_config
+    genome_config.num_outputs = num_outputs
+    genome_config.output_keys = list(range(num_outputs))
+    config.pop_size = pop_size
+    return config
+
+
+def scenario_evaluator(scenario, n_enemies, max_frames, decision_interval=1):
+    # evaluate(genomes, config, timer) -> frames simulated
+    if scenario in ("single", "sensors"):
+        def evaluate(genomes, config, timer):
+            ge = [genome for genome_id, genome in genomes]
+            tapes, player_x = new_episodes(len(ge), n_enemies=n_enemies)
+            budget = EpisodeBudget(max_frames).start()
+            fitness, frames, _ = run_episode(ge, config, tapes, player_x, budget, timer=timer,
+                                             sensors=scenario == "sensors",
+                                             decision_interval=decision_interval)
+            for genome, value in zip(ge, aggregate_fitness(fitness).tolist()):
+                genome.fitness = value
+            return frames
+        return evaluate
+
+    if scenario == "two_enemies":
+        def evaluate(genomes, config, timer):
+            return main_two_enemies.eval_genomes(genomes, config, render=False, n_enemies=n_enemies,
+                                                 max_frames=max_frames, timer=timer)
+        return evaluate
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.init()
+
+    def evaluate(genomes, config, timer):
+        return main_visualize.train_genomes(genomes, config, n_enemies=n_enemies, max_frames=max_frames,
+                                            display_hz=None, timer=timer)
+    return evaluate
+
+
+def run_case(scenario, pop_size, n_enemies, generations=2, max_frames=300, seed=0, phases=False,
+             decision_interval=1):
+    random.seed(seed)
+    np.random.seed(seed)
+    config = scenario_config(scenario, pop_size, n_enemies)
+    population = neat.Population(config)
+    evaluate = scenario_evaluator(scenario, n_enemies, max_frames, decision_interval)
+    setup_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    per_generation = []
+
+    def timed_evaluate(genomes, config):
+        timer = PhaseTimer() if phases else FrameCounter()
+        start = time.perf_counter()
+        frames = evaluate(genomes, config, timer)
+        seconds = time.perf_counter() - start
+        per_generation.append({
+            "genomes": len(genomes),
+            "frames": frames,
+            "genome_frames": timer.frames,
+            "eval_seconds": seconds,
+            "phases": timer.totals,
+        })
+
+    start = time.perf_counter()
+    population.run(timed_evaluate, generations)
+    wall = time.perf_counter() - start
+
+    eval_seconds = sum(g["eval_seconds"] for g in per_generation)
+    frames = sum(g["frames"] for g in per_generation)
+    genome_frames = sum(g["genome_frames"] for g in per_generation)
+    return {
+        "scenario": scenario,
+        "pop_size": pop_size,
+        "enemies": n_enemies,
+        "generations": len(per_generation),
+        "max_frames": max_frames,
+        "seed": seed,
+        "decision_interval": decision_interval,
+        "frames": frames,
+        "genome_frames": genome_frames,
+        "wall_seconds": wall,
+        "eval_seconds": eval_seconds,
+        "reproduction_seconds": wall - eval_seconds,
+        "genome_frames_per_second": genome_frames / eval_seconds if eval_seconds else 0.0,
+        "frame_latency_ms": 1000 * eval_seconds / frames if frames else 0.0,
+        # ru_maxrss is in KiB on Linux
+        "setup_rss_mb": setup_rss / 1024,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "per_generation": per_generation,
+    }
+
+
+def run_case_subprocess(scenario, pop_size, n_enemies, args):
+    command = [sys.executable, os.path.abspath(__file__), "--case", scenario, str(pop_size), str(n_enemies),
+               "--generations", str(args.generations), "--max-frames", str(args.max_frames),
+               "--seed", str(args.seed), "--decision-interval", str(args.decision_interval)]
+    if args.phases:
+        command.append("--phases")
+    try:
+        done = subprocess.run(command, capture_output=True, text=True, timeout=args.timeout)
+    except subprocess.TimeoutExpired:
+        return {"scenario": scenario, "pop_size": pop_size, "enemies": n_enemies,
+                "error": f"timed out after {args.timeout} s"}
+    if done.returncode != 0:
+        return {"scenario": scenario, "pop_size": pop_size, "enemies": n_enemies,
+                "error": done.stderr.strip().splitlines()[-1] if done.stderr.strip() else f"exit {done.returncode}"}
+    # The case prints its result as the last line; NEAT's own output comes before
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+
+def package_version(name):
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the evaluation pipeline of every scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--pop-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--enemies", type=int, nargs="+", default=[6, 24, 96])
+    parser.add_argument("--generations", type=int, default=2)
+    parser.add_argument("--max-frames", type=int, default=300,
+                        help="frames per episode at most, so every case does a bounded amount of work")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--decision-interval", type=positive_int, default=1,
+                        help="frames between network activations in the single and sensors scenarios")
+    parser.add_argument("--phases", action="store_true",
+                        help="also record the per-phase time split (adds a little timing overhead)")
+    parser.add_argument("--timeout", type=float, default=3600,
+                        help="seconds before a case is abandoned")
+    parser.add_argument("--output", default=None,
+                        help="results file (default: benchmark-<commit>.json)")
+    parser.add_argument("--case", nargs=3, metavar=("SCENARIO", "POP", "ENEMIES"), default=None,
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        scenario, pop_size, n_enemies = args.case
+        result = run_case(scenario, int(pop_size), int(n_enemies), args.generations, args.max_frames,
+                          args.seed, args.phases, args.decision_interval)
+        print(json.dumps(result))
+        sys.exit(0)
+
+    commit = git_commit()
+    results = []
+    for scenario, pop_size, n_enemies in itertools.product(args.scenarios, args.pop_sizes, args.enemies):
+        print(f"{scenario:<12} pop {pop_size:>6}  enemies {n_enemies:>3} ... ", end="", flush=True)
+        result = run_case_subprocess(scenario, pop_size, n_enemies, args)
+        results.append(result)
+        if "error" in result:
+            print(result["error"])
+        else:
+            print(f"{result['genome_frames_per_second']:>12,.0f} genome-frames/s  "
+                  f"{result['frame_latency_ms']:8.2f} ms/frame  {result['peak_rss_mb']:7.1f} MB peak")
+
+    output = args.output or f"benchmark-{commit or 'unknown'}.json"
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "neat": package_version("neat-python"),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": {"generations": args.generations, "max_frames": args.max_frames, "seed": args.seed,
+                         "decision_interval": args.decision_interval},
+            "results": results,
+        }, f, indent=2)
+    print(f"Results written to {output}")
@@ -0,0 +1,144 @@
+import glob
+import gzip
+import itertools
+import os
+import pickle
+import random
+import re
+import threading
+
+import neat
+
+
+# ---------------- Asynchronous population checkpoints ---------------- #
+# Full NEAT state (genomes, species with their stagnation history, RNG state,
+# generation counter and next genome key) is pickled at the end of a
+# generation, then compressed and written by a background thread:
+# write to a temporary file, fsync, atomic rename, prune to the newest
+# `keep` files. If the writer is still busy when the next checkpoint is
+# due, the newer snapshot replaces the one waiting, so training never waits.
+# `settings` (a dict of the run options the networks depend on, such as the
+# enemy count) is saved alongside and comes back as population.settings;
+# the overall best fitness comes back as population.best_fitness.
+class AsyncCheckpointer(neat.reporting.BaseReporter):
+    def __init__(self, generation_interval=100, directory="checkpoints", keep=3, compresslevel=5,
+                 filename_prefix="neat-checkpoint-", settings=None):
+        self.generation_interval = generation_interval
+        self.directory = directory
+        self.keep = keep
+        self.compresslevel = compresslevel
+        self.filename_prefix = filename_prefix
+        self.current_generation = None
+        self.best_genome = None
+        self.best_fitness = None
+        self.settings = dict(settings or {})
+
+        self._pending = None
+        self._busy = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def start_generation(self, generation):
+        self.current_generation = generation
+
+    def post_evaluate(self, config, population, species, best_genome):
+        # Same rule as Population.run for its overall best genome, but elites
+        # are re-evaluated, so the best fitness is kept apart from the genome
+        if self.best_fitness is None or best_genome.fitness > self.best_fitness:
+            self.best_genome, self.best_fitness = best_genome, best_genome.fitness
+
+    def end_generation(self, config, population, species_set):
+        if (self.current_generation + 1) % self.generation_interval == 0:
+            self.save_checkpoint(config, population, species_set, self.current_generation)
+
+    def save_checkpoint(self, config, population, species_set, generation):
+        # population already holds the next generation, which is what a
+        # resumed run starts from. The snapshot must be taken now, before that
+        # generation is evaluated; compression and disk writes happen on the
+        # writer thread.
+        next_genome_key = max(population) + 1 if population else 1
+        data = (generation + 1, config, population, species_set, random.getstate(),
+                next_genome_key, self.best_genome, self.settings, self.best_fitness)
+
+        # The species set holds the live reporters (this one included);
+        # they are reattached on restore instead of being pickled
+        reporters, species_set.reporters = species_set.reporters, None
+        try:
+            snapshot = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            species_set.reporters = reporters
+        with self._condition:
+            self._pending = (generation + 1, snapshot)
+            self._condition.notify()
+
+    def _write_loop(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                generation, snapshot = self._pending
+                self._pending = None
+                self._busy = True
+            try:
+                self._write(generation, snapshot)
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _write(self, generation, snapshot):
+        os.makedirs(self.directory, exist_ok=True)
+        filename = os.path.join(self.directory, f"{self.filename_prefix}{generation}.pkl.gz")
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, "wb") as f:
+            f.write(gzip.compress(snapshot, compresslevel=self.compresslevel))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
+
+        for old in list_checkpoints(self.directory, self.filename_prefix)[:-self.keep]:
+            os.remove(old)
+
+    def flush(self):
+        # Blocks until every queued snapshot is on disk
+        with self._condition:
+            while self._pending is not None or self._busy:
+                self._condition.wait()
+
+    def close(self):
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._writer.join()
+
+
+def list_checkpoints(directory="checkpoints", filename_prefix="neat-checkpoint-"):
+    # Checkpoint files, oldest generation first
+    pattern = re.compile(re.escape(filename_prefix) + r"(\d+)\.pkl\.gz$")
+    found = []
+    for path in glob.glob(os.path.join(directory, filename_prefix + "*.pkl.gz")):
+        match = pattern.search(os.path.basename(path))
+        if match:
+            found.append((int(match.group(1)), path))
+    return [path for generation, path in sorted(found)]
+
+
+def restore_checkpoint(filename):
+    # Rebuilds a neat.Population that continues exactly where the checkpoint left off
+    with gzip.open(filename) as f:
+        data = pickle.load(f)
+    generation, config, population, species_set, rndstate, next_genome_key, best_genome = data[:7]
+    random.setstate(rndstate)
+    restored = neat.Population(config, (population, species_set, generation))
+    species_set.reporters = restored.reporters
+    restored.reproduction.genome_indexer = itertools.count(next_genome_key)
+    restored.best_genome = best_genome
+    # Checkpoints written before settings were saved have none
+    restored.settings = data[7] if len(data) > 7 else {}
+    restored.best_fitness = data[8] if len(data) > 8 else best_genome and best_genome.fitness
+    return restored
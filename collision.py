@@ -0,0 +1,64 @@
+import bisect
+
+import numpy as np
+
+
+# ---------------- Broad-phase collision index ---------------- #
+# Sort-and-sweep on x: enemies are sorted by their left edge once per frame,
+# and each query only looks at the enemies whose x-span can overlap it. The
+# narrow phase is the same test as pygame.Rect.colliderect.
+class SweepIndex:
+    def __init__(self, x, y, w, h):
+        x, y = np.asarray(x), np.asarray(y)
+        order = np.argsort(x, kind="stable")
+        self.order = order
+        self.x = x[order].astype(np.int64)
+        self.y = y[order].astype(np.int64)
+        self.w = np.broadcast_to(np.asarray(w, dtype=np.int64), x.shape)[order]
+        self.h = np.broadcast_to(np.asarray(h, dtype=np.int64), x.shape)[order]
+        self.max_w = int(self.w.max()) if len(self.w) else 0
+        self._lists = None
+
+    @classmethod
+    def from_rects(cls, rects):
+        return cls([r.x for r in rects], [r.y for r in rects],
+                   [r.width for r in rects], [r.height for r in rects])
+
+    def overlaps(self, x, y, w, h):
+        # For arrays of query rects: True where the rect collides with any entry
+        x = np.asarray(x, dtype=np.int64)
+        y = np.asarray(y, dtype=np.int64)
+        hit = np.zeros(len(x), dtype=bool)
+        if not len(self.x) or not len(x):
+            return hit
+
+        # Only entries inside the y-band spanned by all queries can collide
+        # (players share one row, so this usually leaves a handful)
+        band = np.flatnonzero((self.y < y.max() + h) & (self.y + self.h > y.min()))
+        if not len(band):
+            return hit
+        ex, ey, ew, eh = self.x[band], self.y[band], self.w[band], self.h[band]
+
+        lo = np.searchsorted(ex, x - self.max_w, side="right")
+        hi = np.searchsorted(ex, x + w, side="left")
+        for offset in range(int((hi - lo).max(initial=0))):
+            rows = np.flatnonzero((lo + offset < hi) & ~hit)
+            if not len(rows):
+                break
+            k = lo[rows] + offset
+            qx, qy = x[rows], y[rows]
+            hit[rows] = ((qx < ex[k] + ew[k]) & (ex[k] < qx + w) &
+                         (qy < ey[k] + eh[k]) & (ey[k] < qy + h))
+        return hit
+
+    def first_hit(self, rect):
+        # Single pygame.Rect query; original index of a colliding entry or -1
+        if self._lists is None:
+            self._lists = [a.tolist() for a in (self.x, self.y, self.w, self.h, self.order)]
+        xs, ys, ws, hs, order = self._lists
+        lo = bisect.bisect_right(xs, rect.x - self.max_w)
+        hi = bisect.bisect_left(xs, rect.x + rect.width)
+        for k in range(lo, hi):
+            if rect.x < xs[k] + ws[k] and rect.y < ys[k] + hs[k] and ys[k] < rect.y + rect.height:
+                return order[k]
+        return -1
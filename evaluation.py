@@ -0,0 +1,268 @@
+import multiprocessing
+import random
+import time
+
+import numpy as np
+
+from population_net import PopulationNetwork
+from profiling import PhaseTimer, NULL_TIMER
+from fitness import fitness_deltas, DEATH_PENALTY
+from live import LiveBuffer
+from recording import EpisodeRecorder, Trace
+from sensors import FrameSensors
+from simulation import EnemyTape, World, spawn_players
+
+
+# ---------------- Episode setup ---------------- #
+def set_num_inputs(config, num_inputs):
+    # Resize the network input layer to match the observation size
+    genome_config = config.genome_config
+    genome_config.num_inputs = num_inputs
+    genome_config.input_keys = [-i - 1 for i in range(num_inputs)]
+
+
+def new_episodes(n_players, n_seeds=1, rng=random, n_frames=0, seeds=None, **tape_kwargs):
+    # Everything that makes an episode random: the enemy tape (from a seed)
+    # and the player spawn positions. Every evaluator builds its World from
+    # these; n_seeds independent episodes give (tapes, player_x[seed, player]).
+    # With fixed seeds every player of an episode spawns at the same x, drawn
+    # from its seed, so a genome's fitness depends on nothing but the seeds.
+    if seeds is None:
+        seeds = [None] * n_seeds
+    tapes, player_x = [], []
+    for seed in seeds:
+        if seed is None:
+            tape = EnemyTape(rng.getrandbits(32), n_frames=n_frames, **tape_kwargs)
+            x = spawn_players(n_players, tape.border_thickness, rng)
+        else:
+            tape = EnemyTape(seed, n_frames=n_frames, **tape_kwargs)
+            x = np.repeat(spawn_players(1, tape.border_thickness, random.Random(f"spawn-{seed}")), n_players)
+        tapes.append(tape)
+        player_x.append(x)
+    return tapes, np.array(player_x, dtype=np.int64).reshape(len(seeds), n_players)
+
+
+def make_world(tapes, player_x, sensors=False, decision_interval=1):
+    if decision_interval < 1:
+        raise ValueError(f"decision interval must be at least 1, got {decision_interval}")
+    world = World(player_x.shape[1], tapes, player_x=player_x)
+    if sensors:
+        world.sensors = FrameSensors()
+    world.decision_interval = decision_interval
+    return world
+
+
+def aggregate_fitness(fitness, how="mean"):
+    # Per-genome fitness from a (seed, genome) array
+    if how == "min":
+        return fitness.min(axis=0)
+    return fitness.mean(axis=0)
+
+
+# ---------------- Evaluation budget ---------------- #
+# Caps an episode at max_frames and/or a wall-clock time_budget (seconds).
+# When the cap is hit every surviving player stops on the same frame and
+# keeps the fitness earned so far; no death penalty is applied.
+class EpisodeBudget:
+    def __init__(self, max_frames=None, time_budget=None):
+        self.max_frames = max_frames
+        self.time_budget = time_budget
+        self.deadline = None
+
+    def start(self):
+        if self.time_budget is not None:
+            self.deadline = time.perf_counter() + self.time_budget
+        return self
+
+    def exhausted(self, frame):
+        # Called before each frame with the number of frames already played
+        if self.max_frames is not None and frame >= self.max_frames:
+            return True
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+
+# Worker-side budget for sharded evaluation. shared[0] is the agreed stop
+# frame (-1 while unset) and shared[1 + slot] the frame each shard has
+# committed to reach. The master sets the stop frame to the furthest
+# committed frame, so every shard can still reach it and all survivors
+# are finalized on the same frame.
+class SharedBudget:
+    def __init__(self, shared, slot, max_frames=None):
+        self.shared = shared
+        self.slot = slot
+        self.max_frames = max_frames
+
+    def exhausted(self, frame):
+        if self.max_frames is not None and frame >= self.max_frames:
+            return True
+        with self.shared.get_lock():
+            stop = self.shared[0]
+            if stop >= 0 and frame >= stop:
+                return True
+            self.shared[1 + self.slot] = frame + 1
+        return False
+
+
+# ---------------- Frame step ---------------- #
+def step_episode(world, nets, fitness, outputs, timer=NULL_TIMER):
+    # Advances one frame; returns the players that were alive at its start
+    world.move_enemies()
+    active = np.flatnonzero(world.alive)
+    timer.lap("movement")
+
+    # Off decision frames the players repeat their last outputs
+    if world.survival_time % world.decision_interval == 0:
+        observations = world.observations(active)
+        timer.lap("inputs")
+        outputs[active] = nets.activate(observations, active)
+        timer.lap("activate")
+    world.move_players(outputs)
+    timer.lap("movement")
+
+    episode = world.episode[active]
+    fitness[active] += fitness_deltas(world.player_x[active], world.player_y[active],
+                                      world.enemy_x[episode], world.enemy_y[episode])
+    timer.lap("fitness")
+
+    # Out of bounds or collision
+    fitness[world.check_deaths()] -= DEATH_PENALTY
+    timer.lap("collision")
+
+    world.tick()
+    timer.count(len(active))
+    return active
+
+
+def run_episode(genomes, config, tapes, player_x, budget=None, record=False, live=None, timer=NULL_TIMER,
+                sensors=False, decision_interval=1):
+    # Headless evaluation of a list of genomes on every episode at once;
+    # returns their fitness as a (seed, genome) array, the frames played and,
+    # with record, a Trace of the first episode. Frames are also published to
+    # a LiveBuffer when one is given.
+    n_seeds = len(tapes)
+    timer.start()
+    nets = PopulationNetwork.create(genomes, config, repeat=n_seeds)
+    timer.lap("network creation")
+    world = make_world(tapes, player_x, sensors, decision_interval)
+    fitness = np.zeros(n_seeds * len(genomes))
+    outputs = np.zeros((n_seeds * len(genomes), nets.n_outputs))
+    recorder = EpisodeRecorder(world, [g.key for g in genomes]) if record else None
+    while world.alive.any():
+        if budget is not None and budget.exhausted(world.survival_time):
+            break
+        step_episode(world, nets, fitness, outputs, timer)
+        if recorder is not None:
+            recorder.record(world, outputs)
+        if live is not None:
+            live.publish(world)
+        if recorder is not None or live is not None:
+            timer.lap("recording")
+    trace = recorder.finish(fitness) if recorder is not None else None
+    return fitness.reshape(n_seeds, len(genomes)), world.survival_time, trace
+
+
+def evaluate_genomes(genomes, config, n_seeds=1, aggregate="mean", max_frames=None, time_budget=None,
+                     record=False, live=None, timer=NULL_TIMER, seeds=None, sensors=False, decision_interval=1,
+                     **tape_kwargs):
+    # Headless single-process evaluation with the population.run signature;
+    # returns the episode Trace when record is set
+    ge = [genome for genome_id, genome in genomes]
+    tapes, player_x = new_episodes(len(ge), n_seeds, seeds=seeds, **tape_kwargs)
+    budget = EpisodeBudget(max_frames, time_budget).start()
+    fitness, _, trace = run_episode(ge, config, tapes, player_x, budget, record, live, timer, sensors,
+                                    decision_interval)
+    for genome, value in zip(ge, aggregate_fitness(fitness, aggregate).tolist()):
+        genome.fitness = value
+    return trace
+
+
+# ---------------- Multi-process evaluation ---------------- #
+# Players never interact with each other, only with the shared enemies, so a
+# generation can be split into shards that each replay the same episode. The
+# master generates the enemy tapes once, long enough for the last generation's
+# episode, and ships them to every shard. With a live feed, the first shard
+# publishes its slice of the population.
+_worker_config = None
+_worker_shared = None
+_worker_live = None
+
+
+def _init_worker(config, shared, live_name=None):
+    global _worker_config, _worker_shared, _worker_live
+    _worker_config = config
+    _worker_shared = shared
+    if live_name is not None:
+        _worker_live = LiveBuffer.attach(live_name)
+
+
+def _run_shard(args):
+    # Returns run_episode's result plus the shard's phase times when profiling
+    slot, genomes, tapes, player_x, max_frames, timed, record, profile, sensors, decision_interval = args
+    if timed:
+        budget = SharedBudget(_worker_shared, slot, max_frames)
+    else:
+        budget = EpisodeBudget(max_frames)
+    live = _worker_live if slot == 0 else None
+    timer = PhaseTimer() if profile else NULL_TIMER
+    result = run_episode(genomes, _worker_config, tapes, player_x, budget, record, live, timer, sensors,
+                         decision_interval)
+    return result + ((timer.totals, timer.frames) if profile else None,)
+
+
+class ShardedEvaluator:
+    def __init__(self, num_workers, config, n_seeds=1, aggregate="mean", max_frames=None, time_budget=None,
+                 live_name=None, seeds=None, sensors=False, decision_interval=1, **tape_kwargs):
+        self.num_workers = num_workers
+        self.seeds = seeds
+        self.sensors = sensors
+        self.decision_interval = decision_interval
+        self.n_seeds = n_seeds
+        self.aggregate = aggregate
+        self.max_frames = max_frames
+        self.time_budget = time_budget
+        self.tape_kwargs = tape_kwargs
+        self.expected_frames = 0
+        self.shared = multiprocessing.Array("q", num_workers + 1)
+        self.pool = multiprocessing.Pool(num_workers, initializer=_init_worker,
+                                         initargs=(config, self.shared, live_name))
+
+    def __del__(self):
+        self.pool.close()
+        self.pool.join()
+
+    def evaluate(self, genomes, config, record=False, timer=NULL_TIMER):
+        ge = [genome for genome_id, genome in genomes]
+        n_frames = self.expected_frames
+        if self.max_frames is not None:
+            n_frames = min(n_frames, self.max_frames)
+        tapes, player_x = new_episodes(len(ge), self.n_seeds, n_frames=n_frames, seeds=self.seeds,
+                                       **self.tape_kwargs)
+
+        with self.shared.get_lock():
+            self.shared[:] = [-1] + [0] * self.num_workers
+
+        shards = [s for s in np.array_split(np.arange(len(ge)), self.num_workers) if len(s)]
+        timed = self.time_budget is not None
+        jobs = [(slot, [ge[i] for i in shard], tapes, player_x[:, shard], self.max_frames, timed, record,
+                 timer.enabled, self.sensors, self.decision_interval)
+                for slot, shard in enumerate(shards)]
+        pending = self.pool.map_async(_run_shard, jobs)
+
+        # Past the time budget, stop every shard on the furthest committed frame
+        if timed:
+            pending.wait(self.time_budget)
+            if not pending.ready():
+                with self.shared.get_lock():
+                    self.shared[0] = max(self.shared[1:])
+
+        self.expected_frames = 0
+        traces = []
+        for shard, (fitness, frames, trace, phases) in zip(shards, pending.get()):
+            self.expected_frames = max(self.expected_frames, frames)
+            if phases is not None:
+                timer.merge(*phases)
+            for i, value in zip(shard.tolist(), aggregate_fitness(fitness, self.aggregate).tolist()):
+                ge[i].fitness = value
+            traces.append(trace)
+        # Shards play consecutive slices of the same episode
+        return Trace.concat(traces) if record else None
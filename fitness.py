@@ -0,0 +1,31 @@
+import numpy as np
+
+from simulation import SCREEN_WIDTH, PLAYER_SIZE, ENEMY_SIZE
+
+
+# ---------------- Fitness shaping ---------------- #
+SURVIVAL_REWARD = 0.1
+DISTANCE_REWARD = 0.5    # times the distance to the nearest enemy / SCREEN_WIDTH
+WALL_PENALTY = 0.05      # per frame spent hugging a side wall
+DEATH_PENALTY = 1.0      # out of bounds or collision
+
+WALL_LEFT, WALL_RIGHT = 40, SCREEN_WIDTH - 70
+
+
+def fitness_deltas(player_x, player_y, enemy_x, enemy_y):
+    # Per-frame fitness change for each given player (deaths excluded).
+    # Enemy arrays are either shared (enemies,) or per player (players, enemies).
+    player_x = np.asarray(player_x, dtype=np.int64)
+    px = player_x + PLAYER_SIZE // 2
+    py = np.asarray(player_y, dtype=np.int64) + PLAYER_SIZE // 2
+    dx = (np.asarray(enemy_x, dtype=np.int64) + ENEMY_SIZE // 2) - px[:, None]
+    dy = (np.asarray(enemy_y, dtype=np.int64) + ENEMY_SIZE // 2) - py[:, None]
+
+    # Nearest enemy by Manhattan distance, rewarded by Euclidean distance
+    nearest = np.argmin(np.abs(dx) + np.abs(dy), axis=1)
+    rows = np.arange(len(px))
+    dist = np.sqrt(dx[rows, nearest] ** 2 + dy[rows, nearest] ** 2)
+
+    delta = SURVIVAL_REWARD + (dist / SCREEN_WIDTH) * DISTANCE_REWARD
+    delta -= WALL_PENALTY * ((player_x < WALL_LEFT) | (player_x > WALL_RIGHT))
+    return delta
@@ -0,0 +1,77 @@
+from collections import OrderedDict
+
+
+# ---------------- Fitness cache ---------------- #
+# Elites are carried over unchanged and reproduction can produce clones, so
+# with fixed episode seeds some genomes of a generation have already been
+# evaluated, or appear twice. The cache wraps an evaluate function with the
+# population.run signature and hands it only genomes it has not seen,
+# once each; the rest get the stored fitness.
+#
+# Genomes are keyed by what their network computes: node biases, responses,
+# activations and aggregations, and the enabled connections with their
+# weights. `context` (episode seeds, enemy count, frame cap, ...) goes into
+# every key, so results from different episodes never mix. Only valid when
+# the evaluation is deterministic, i.e. fixed seeds and no time budget.
+def genome_digest(genome, context=None):
+    # frozensets: equal genes in any order give the same key, without sorting
+    nodes = frozenset([(key, node.bias, node.response, node.activation, node.aggregation)
+                       for key, node in genome.nodes.items()])
+    connections = frozenset([(key, c.weight) for key, c in genome.connections.items() if c.enabled])
+    return hash((context, nodes, connections))
+
+
+class FitnessCache:
+    def __init__(self, evaluate, context, max_size=10000):
+        self.evaluate = evaluate
+        self.context = repr(context)
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # NEAT never changes a genome after creating it, and elites keep
+        # their key, so their digests are looked up instead of recomputed
+        self.digests = {}
+
+    def keys(self, genomes):
+        digests = {}
+        for genome_id, genome in genomes:
+            digest = self.digests.get(genome_id)
+            digests[genome_id] = genome_digest(genome, self.context) if digest is None else digest
+        self.digests = digests
+        return [digests[genome_id] for genome_id, genome in genomes]
+
+    def __call__(self, genomes, config, **kwargs):
+        keys = self.keys(genomes)
+        fitness = {}
+        todo = {}
+        for (genome_id, genome), key in zip(genomes, keys):
+            if key in fitness or key in todo:
+                continue
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                fitness[key] = self.entries[key]
+            else:
+                todo[key] = (genome_id, genome)
+        self.hits += len(genomes) - len(todo)
+        self.misses += len(todo)
+
+        result = self.evaluate(list(todo.values()), config, **kwargs) if todo else None
+        for key, (genome_id, genome) in todo.items():
+            fitness[key] = genome.fitness
+        for (genome_id, genome), key in zip(genomes, keys):
+            genome.fitness = fitness[key]
+        self.store(fitness)
+        return result
+
+    def store(self, fitness):
+        # fitness: {key: value}; least recently used entries go first
+        for key, value in fitness.items():
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def remember(self, genomes):
+        # Adds genomes evaluated without the cache (e.g. a recorded generation)
+        self.store({key: genome.fitness for (genome_id, genome), key in zip(genomes, self.keys(genomes))})
@@ -0,0 +1,176 @@
+import multiprocessing
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+# ---------------- Shared-memory live feed ---------------- #
+# Training publishes the displayed episode, one fixed-size record per frame,
+# into a ring of slots in shared memory; a viewer process (live_viewer.py)
+# reads the newest complete record and simply skips the ones it was too slow
+# to draw. The trainer never waits on the viewer.
+#
+#   header  int64[8]  version, max players, max enemies, slots, records
+#                     written, viewer heartbeat (ns), generation, trainer pid
+#   slot    int64[8]  sequence, frame, generation, players, enemies,
+#                     player y, border thickness, players alive
+#           int16     player_x[max players], enemy_x / enemy_y[max enemies]
+#
+# Each slot is a seqlock: the sequence is odd while the slot is written, so
+# a reader that sees it odd or changed after copying throws the copy away.
+# The viewer refreshes its heartbeat every frame; with no fresh heartbeat
+# the trainer publishes nothing. A block whose trainer is still running is
+# never taken over: a second trainer needs another name.
+LIVE_FORMAT_VERSION = 1
+DEFAULT_NAME = "avoid-cubes-live"
+HEADER_WORDS = 8
+SLOT_META_WORDS = 8
+HEARTBEAT_TIMEOUT = 2.0   # seconds without a viewer heartbeat before it counts as detached
+DEAD_X = np.iinfo(np.int16).min
+
+
+def _attach(name):
+    # A separate process (the viewer) must not leave the block registered with
+    # its own resource tracker, or it would be unlinked when that process
+    # exits. Pool workers share the trainer's tracker and are left alone.
+    shm = shared_memory.SharedMemory(name=name)
+    if multiprocessing.parent_process() is None:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _process_alive(pid):
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _slot_bytes(max_players, max_enemies):
+    n = SLOT_META_WORDS * 8 + 2 * (max_players + 2 * max_enemies)
+    return (n + 7) // 8 * 8
+
+
+class LiveBuffer:
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((HEADER_WORDS,), dtype=np.int64, buffer=shm.buf)
+        version, self.max_players, self.max_enemies, self.n_slots = self.header[:4].tolist()
+        if version != LIVE_FORMAT_VERSION:
+            raise ValueError(f"{shm.name}: unsupported live buffer version {version}")
+
+        size = _slot_bytes(self.max_players, self.max_enemies)
+        self.meta, self.player_x, self.enemy_x, self.enemy_y = [], [], [], []
+        for slot in range(self.n_slots):
+            offset = HEADER_WORDS * 8 + slot * size
+            self.meta.append(np.ndarray((SLOT_META_WORDS,), dtype=np.int64, buffer=shm.buf, offset=offset))
+            offset += SLOT_META_WORDS * 8
+            self.player_x.append(np.ndarray((self.max_players,), dtype=np.int16, buffer=shm.buf, offset=offset))
+            offset += 2 * self.max_players
+            self.enemy_x.append(np.ndarray((self.max_enemies,), dtype=np.int16, buffer=shm.buf, offset=offset))
+            offset += 2 * self.max_enemies
+            self.enemy_y.append(np.ndarray((self.max_enemies,), dtype=np.int16, buffer=shm.buf, offset=offset))
+        self._last_check = 0.0
+        self._attached = False
+
+    @classmethod
+    def create(cls, max_players, max_enemies, n_slots=64, name=DEFAULT_NAME):
+        size = HEADER_WORDS * 8 + n_slots * _slot_bytes(max_players, max_enemies)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Only reclaimed if the trainer that created it is gone
+            stale = _attach(name)
+            owner = 0
+            if stale.size >= HEADER_WORDS * 8:
+                owner = int(np.ndarray((HEADER_WORDS,), dtype=np.int64, buffer=stale.buf)[7])
+            stale.close()
+            if _process_alive(owner):
+                raise FileExistsError(f"{name}: live buffer in use by the trainer with pid {owner}; "
+                                      f"choose another name") from None
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((HEADER_WORDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = [LIVE_FORMAT_VERSION, max_players, max_enemies, n_slots, 0, 0, -1, os.getpid()]
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name=DEFAULT_NAME):
+        return cls(_attach(name))
+
+    def close(self):
+        # Views must go before the mapping can be closed
+        self.header = self.meta = self.player_x = self.enemy_x = self.enemy_y = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    # ---- trainer side ---- #
+    def set_generation(self, generation):
+        self.header[6] = generation
+
+    def viewer_attached(self):
+        # Re-read the heartbeat a few times per second, not every frame
+        now = time.perf_counter()
+        if now - self._last_check > 0.25:
+            self._last_check = now
+            heartbeat = int(self.header[5])
+            self._attached = heartbeat > 0 and time.time_ns() - heartbeat < HEARTBEAT_TIMEOUT * 1e9
+        return self._attached
+
+    def publish(self, world, episode=0):
+        # Writes the first max_players players of one episode of a World
+        if not self.viewer_attached():
+            return
+        n_players = min(world.n_players, self.max_players)
+        n_enemies = min(world.n_enemies, self.max_enemies)
+        rows = slice(episode * world.n_players, episode * world.n_players + n_players)
+        alive = world.alive[rows]
+
+        count = int(self.header[4])
+        slot = count % self.n_slots
+        meta = self.meta[slot]
+        seq = int(meta[0]) + 1
+        meta[0] = seq   # odd: being written
+        meta[1:] = [world.survival_time, self.header[6], n_players, n_enemies,
+                    world.player_y[0], world.border_thickness, int(alive.sum())]
+        self.player_x[slot][:n_players] = np.where(alive, world.player_x[rows], DEAD_X)
+        self.enemy_x[slot][:n_enemies] = world.enemy_x[episode, :n_enemies]
+        self.enemy_y[slot][:n_enemies] = world.enemy_y[episode, :n_enemies]
+        meta[0] = seq + 1
+        self.header[4] = count + 1
+
+    # ---- viewer side ---- #
+    def heartbeat(self, attached=True):
+        self.header[5] = time.time_ns() if attached else 0
+
+    def latest(self):
+        # Newest complete record as a dict of copies, or None if there is none
+        # yet or it was overwritten while being read
+        count = int(self.header[4])
+        if count == 0:
+            return None
+        slot = (count - 1) % self.n_slots
+        meta = self.meta[slot]
+        seq = int(meta[0])
+        if seq % 2:
+            return None
+        frame, generation, n_players, n_enemies, player_y, border, alive = meta[1:].tolist()
+        record = {
+            "frame": frame, "generation": generation, "player_y": player_y,
+            "border_thickness": border, "alive": alive,
+            "player_x": self.player_x[slot][:n_players].copy(),
+            "enemy_x": self.enemy_x[slot][:n_enemies].copy(),
+            "enemy_y": self.enemy_y[slot][:n_enemies].copy(),
+        }
+        if int(meta[0]) != seq:
+            return None
+        return record
@@ -0,0 +1,77 @@
+import argparse
+import time
+
+import pygame
+
+from live import LiveBuffer, DEAD_X, DEFAULT_NAME
+from main import Player, Border, Enemy, SCREEN_WIDTH, SCREEN_HEIGHT
+from rendering import sprite, CachedText, DirtyLayer
+
+
+# ---------------- Live viewer ---------------- #
+# Draws whatever a trainer started with --live is publishing. Only the newest
+# record is drawn each frame, so a slow viewer drops frames instead of
+# holding training back. Closing the viewer lets training run unobserved.
+def connect(name, retry=1.0):
+    while True:
+        try:
+            return LiveBuffer.attach(name)
+        except FileNotFoundError:
+            print(f"Waiting for a trainer publishing to '{name}' ...")
+            time.sleep(retry)
+
+
+def view(buffer, display_hz=60):
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Avoid Cubes - Live")
+    font = pygame.font.SysFont(None, 28)
+    clock = pygame.time.Clock()
+
+    hud_text = CachedText(font, (200, 150, 50))
+    player, enemy = Player(), Enemy()
+    enemy_image = sprite(enemy.enemy_width, enemy.enemy_height, enemy.enemy_color)
+    layer, border_thickness = None, None
+    record = None
+    while True:
+        buffer.heartbeat()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                return
+
+        # Keep showing the previous record if the newest one was torn
+        record = buffer.latest() or record
+        if record is not None:
+            if record["border_thickness"] != border_thickness:
+                border_thickness = record["border_thickness"]
+                background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+                Border(border_thickness).draw(background)
+                layer = DirtyLayer(screen, background)
+            layer.clear()
+            layer.draw(enemy_image, record["enemy_x"].tolist(), record["enemy_y"].tolist())
+            player_x = record["player_x"]
+            layer.fill_row(player.player_color, player_x[player_x != DEAD_X], record["player_y"],
+                           player.player_width, player.player_height)
+
+            hud = (f"Gen {record['generation']}  Time {record['frame'] // 60}s  "
+                   f"Alive {record['alive']}/{len(player_x)}  {clock.get_fps():.0f} fps")
+            layer.blit(hud_text.render(hud), (border_thickness + 5, border_thickness + 5))
+            layer.present()
+        else:
+            pygame.display.flip()
+        clock.tick(display_hz)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch a training run started with --live")
+    parser.add_argument("--name", default=DEFAULT_NAME, help="shared memory block to read from")
+    parser.add_argument("--display-hz", type=int, default=60)
+    args = parser.parse_args()
+
+    buffer = connect(args.name)
+    pygame.init()
+    try:
+        view(buffer, display_hz=args.display_hz)
+    finally:
+        buffer.heartbeat(attached=False)
+        buffer.close()
+        pygame.quit()
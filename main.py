@@ -1,7 +1,24 @@
 import pygame
+import os
 import random
 import neat
 import pickle
+import argparse
+from functools import partial
+import numpy as np
+
+from checkpoint import AsyncCheckpointer, list_checkpoints, restore_checkpoint
+from fitness_cache import FitnessCache
+from live import LiveBuffer, DEFAULT_NAME
+from evaluation import (ShardedEvaluator, EpisodeBudget, evaluate_genomes, new_episodes, make_world,
+                        step_episode, set_num_inputs, aggregate_fitness)
+from population_net import PopulationNetwork, save_genome_npz
+from profiling import PhaseTimer, PhaseReporter, NULL_TIMER
+from recording import EpisodeRecorder
+from rendering import FixedTimestep, interpolate, sprite, CachedText, DirtyLayer, Heatmap, top_k
+from sensors import SENSOR_SIZE
+from simulation import observation_size
+from stream_stats import StreamingStatsReporter
 
 
 SCREEN_WIDTH, SCREEN_HEIGHT = 720, 720
@@ -79,115 +96,141 @@ class Enemy:
             self.rect.x = random.randint(self.border_thickness, SCREEN_WIDTH - self.border_thickness - self.enemy_width)
 
 
-def train_genomes(genomes, config):
+def train_genomes(genomes, config, sim_hz=None, display_hz=60, n_enemies=MAX_ENEMIES,
+                  max_frames=None, time_budget=None, n_seeds=1, aggregate="mean", record=False,
+                  heatmap_top=None, timer=NULL_TIMER, seeds=None, sensors=False, decision_interval=1):
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Avoid Cubes (NEAT) - Improved")
-    clock = pygame.time.Clock()
     font = pygame.font.SysFont(None, 36)
 
     border_thickness = 20
     border = Border(border_thickness)
 
-    nets, ge, players = [], [], []
+    ge = []
 
     for genome_id, genome in genomes:
-        net = neat.nn.FeedForwardNetwork.create(genome, config)
-        nets.append(net)
-        players.append(Player(border_thickness=border_thickness))
         genome.fitness = 0
         ge.append(genome)
 
-    # Fixed enemies
+    # Whole generation packed into one batched network, once per seed
+    timer.start()
+    nets = PopulationNetwork.create(ge, config, repeat=n_seeds)
+    timer.lap("network creation")
+
+    # Borders are drawn once into the background; players and enemies are
+    # pre-rendered sprites blitted in one batch each
+    background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    border.draw(background)
+    layer = DirtyLayer(screen, background)
+    player_template = Player(border_thickness=border_thickness)
+    enemy_template = Enemy(border_thickness=border_thickness)
+    enemy_image = sprite(enemy_template.enemy_width, enemy_template.enemy_height, enemy_template.enemy_color)
+    score_text = CachedText(font, (200, 150, 50))
+    player_image = sprite(player_template.player_width, player_template.player_height,
+                          player_template.player_color)
+
+    # Heatmap mode: the heatmap_top fittest players are drawn, the rest binned
+    # along their shared row
+    heatmap = None
+    if heatmap_top is not None:
+        heatmap = Heatmap((0, player_template.rect.y, SCREEN_WIDTH, player_template.player_height),
+                          cell=(8, player_template.player_height))
+
+    # Players and fixed enemies live in one struct-of-arrays world; all seeds
+    # are simulated together and the first one is drawn
     initial_speed = 10
-    enemies = [Enemy(border_thickness=border_thickness, speed=initial_speed) for _ in range(MAX_ENEMIES)]
-
-    survival_time = 0
-    active_players = [True for _ in players]
-
-    while any(active_players):
-        screen.fill((0, 0, 0))
-        border.draw(screen)
-
+    tapes, player_x = new_episodes(len(ge), n_seeds, seeds=seeds, border_thickness=border_thickness,
+                                   n_enemies=n_enemies, initial_speed=initial_speed)
+    world = make_world(tapes, player_x, sensors, decision_interval)
+    shown = slice(0, len(ge))
+    fitness = np.zeros(n_seeds * len(ge))
+    outputs = np.zeros((n_seeds * len(ge), 2))
+    recorder = EpisodeRecorder(world, [g.key for g in ge]) if record else None
+
+    # Game ticks run uncapped (or at sim_hz); frames are presented at display_hz
+    timestep = FixedTimestep(sim_hz, display_hz)
+    previous = (world.player_x[shown].copy(), world.enemy_x[0], world.enemy_y[0])
+    budget = EpisodeBudget(max_frames, time_budget).start()
+
+    while world.alive.any() and not budget.exhausted(world.survival_time):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                fitness = aggregate_fitness(fitness.reshape(n_seeds, len(ge)), aggregate)
+                for genome, value in zip(ge, fitness.tolist()):
+                    genome.fitness = value
                 return
 
-        # Move and draw enemies
-        for enemy in enemies:
-            enemy.move()
-            enemy.draw(screen)
-
-        # Move players
-        for idx, player in enumerate(players):
-            if not active_players[idx]:
-                continue
-
-            # --- Improved input design ---
-            inputs = [
-                player.rect.x / SCREEN_WIDTH,
-                player.rect.y / SCREEN_HEIGHT
-            ]
-            for enemy in enemies:
-                rel_x = (enemy.rect.x - player.rect.x) / SCREEN_WIDTH
-                rel_y = (enemy.rect.y - player.rect.y) / SCREEN_HEIGHT
-                vel_y = enemy.enemy_speed / 25.0
-                inputs += [rel_x, rel_y, vel_y]
-
-            # Activate NN
-            outputs = nets[idx].activate(inputs)
-            player.move_ai(outputs)
-            player.draw(screen)
-
-            # --- Improved fitness function ---
-            ge[idx].fitness += 0.1  # survival reward
-
-            # Reward distance from nearest enemy
-            nearest_enemy = min(enemies, key=lambda e: abs(player.rect.centerx - e.rect.centerx) +
-                                                abs(player.rect.centery - e.rect.centery))
-            dist = ((player.rect.centerx - nearest_enemy.rect.centerx) ** 2 +
-                    (player.rect.centery - nearest_enemy.rect.centery) ** 2) ** 0.5
-            ge[idx].fitness += (dist / SCREEN_WIDTH) * 0.5
-
-            # Penalize hugging walls
-            if player.rect.x < 40 or player.rect.x > SCREEN_WIDTH - 70:
-                ge[idx].fitness -= 0.05
-
-            # Check out of bounds
-            if player.is_out_of_bounds():
-                ge[idx].fitness -= 1.0
-                active_players[idx] = False
-                continue
-
-            # Check collision
-            for enemy in enemies:
-                if player.rect.colliderect(enemy.rect):
-                    ge[idx].fitness -= 1.0
-                    active_players[idx] = False
-                    break
-
-        # Gradually increase enemy speed
-        survival_time += 1
-        for enemy in enemies:
-            enemy.enemy_speed = min(25, initial_speed + survival_time // 300)
+        for _ in timestep.steps():
+            previous = (world.player_x[shown].copy(), world.enemy_x[0], world.enemy_y[0])
+            step_episode(world, nets, fitness, outputs, timer)
+            if recorder is not None:
+                recorder.record(world, outputs)
+                timer.lap("recording")
+            if not world.alive.any() or budget.exhausted(world.survival_time):
+                break
+
+        # Draw the latest state, blended with the previous tick when rate-capped
+        alpha = timestep.alpha()
+        players_x = interpolate(previous[0], world.player_x[shown], alpha)
+        # Enemies only move down, so one that moved up has respawned: both
+        # coordinates snap to the new position
+        respawned = world.enemy_y[0] < previous[2]
+        enemies_x = interpolate(previous[1], world.enemy_x[0], alpha, snap=respawned)
+        enemies_y = interpolate(previous[2], world.enemy_y[0], alpha, snap=respawned)
+        alive = world.alive[shown]
+
+        layer.clear()
+        layer.draw(enemy_image, enemies_x.tolist(), enemies_y.tolist())
+        if heatmap is not None:
+            live = np.flatnonzero(alive)
+            top = live[top_k(fitness[shown][live], heatmap_top)]
+            rest = np.setdiff1d(live, top, assume_unique=True)
+            density = heatmap.render(players_x[rest] + player_template.player_width // 2,
+                                     world.player_y[shown][rest] + player_template.player_height // 2)
+            if density is not None:
+                layer.blit(*density)
+            layer.draw(player_image, players_x[top].tolist(), world.player_y[shown][top].tolist())
+        else:
+            # Players all share one row, so overlapping ones are filled as merged spans
+            layer.fill_row(player_template.player_color, players_x[alive], world.player_y[0],
+                           player_template.player_width, player_template.player_height)
 
         # Display survival time
-        score_text = font.render(f"Survival Time: {survival_time // 60}s", True, (200, 150, 50))
-        screen.blit(score_text, (border_thickness + 5, border_thickness + 5))
+        layer.blit(score_text.render(f"Survival Time: {world.survival_time // 60}s"),
+                   (border_thickness + 5, border_thickness + 5))
 
-        pygame.display.flip()
-        clock.tick(60)
+        layer.present()
+        timer.lap("render")
+        timestep.wait()
+        timer.lap("frame wait")
 
+    trace = recorder.finish(fitness) if recorder is not None else None
+    fitness = aggregate_fitness(fitness.reshape(n_seeds, len(ge)), aggregate)
+    for genome, value in zip(ge, fitness.tolist()):
+        genome.fitness = value
+    return trace
 
-def save_genome(genome, generation, filename_prefix="best_genome"):
+
+def save_genome(genome, generation, filename_prefix="best_genome", config=None, decision_interval=1):
     filename = f"{filename_prefix}_gen_{generation}.pkl"
     with open(filename, "wb") as f:
         pickle.dump(genome, f)
     print(f"✅ Saved best genome at generation {generation} → {filename}")
 
+    # Compact array copy next to the pickle (population_net.load_plan)
+    if config is not None:
+        save_genome_npz(genome, config, f"{filename_prefix}_gen_{generation}.npz", generation=generation,
+                        decision_interval=decision_interval)
+
 
 
 
-def run_neat(n_iterations=10000):
+def run_neat(n_iterations=10000, workers=None, render_every=1, sim_hz=None, display_hz=60,
+             n_enemies=MAX_ENEMIES, max_frames=None, time_budget=None, n_seeds=1, aggregate="mean",
+             checkpoint_every=None, checkpoint_dir="checkpoints", checkpoint_keep=3, resume=None,
+             record_every=None, record_dir="traces", live=False, heatmap_top=None, profile=False,
+             stats_dir="stats", print_interval=5.0, fixed_seeds=False, cache_size=10000, sensors=False,
+             decision_interval=1, live_name=DEFAULT_NAME):
     config_file_path = 'config-feedforward.txt'
     config = neat.Config(
         neat.DefaultGenome,
@@ -196,14 +239,54 @@ def run_neat(n_iterations=10000):
         neat.DefaultStagnation,
         config_file_path
     )
-
-    population = neat.Population(config)
-    population.add_reporter(neat.StdOutReporter(True))
-    stats = neat.StatisticsReporter()
+    set_num_inputs(config, observation_size(n_enemies) + (SENSOR_SIZE if sensors else 0))
+
+    # Continue from a full population checkpoint if requested. The networks
+    # were built for the checkpoint's settings, which replace the flags.
+    if resume == "latest":
+        found = list_checkpoints(checkpoint_dir)
+        if not found:
+            raise FileNotFoundError(f"no checkpoint in {checkpoint_dir}")
+        resume = found[-1]
+    if resume:
+        population = restore_checkpoint(resume)
+        config = population.config
+        n_enemies = population.settings.get("n_enemies", n_enemies)
+        sensors = population.settings.get("sensors", sensors)
+        decision_interval = population.settings.get("decision_interval", decision_interval)
+        num_inputs = observation_size(n_enemies) + (SENSOR_SIZE if sensors else 0)
+        if config.genome_config.num_inputs != num_inputs:
+            raise ValueError(f"{resume}: the networks take {config.genome_config.num_inputs} inputs, but "
+                             f"{n_enemies} enemies {'with' if sensors else 'without'} sensors give {num_inputs}")
+        print(f"Resumed from {resume} at generation {population.generation} "
+              f"({n_enemies} enemies, sensors {'on' if sensors else 'off'}, "
+              f"decision interval {decision_interval})")
+    else:
+        population = neat.Population(config)
+    # Per-generation statistics streamed to disk, a console line every few seconds
+    stats = StreamingStatsReporter(stats_dir, print_interval=print_interval,
+                                   resume_generation=population.generation if resume else None,
+                                   best_genome=population.best_genome if resume else None,
+                                   best_fitness=population.best_fitness if resume else None)
     population.add_reporter(stats)
 
+    # Per-phase timing of every generation
+    timer = PhaseTimer() if profile else NULL_TIMER
+    if profile:
+        population.add_reporter(PhaseReporter(timer))
+
+    # Background full-population checkpoints
+    checkpointer = None
+    if checkpoint_every:
+        checkpointer = AsyncCheckpointer(checkpoint_every, directory=checkpoint_dir, keep=checkpoint_keep,
+                                         settings={"n_enemies": n_enemies, "sensors": sensors,
+                                                   "decision_interval": decision_interval})
+        if resume:
+            checkpointer.best_genome, checkpointer.best_fitness = population.best_genome, population.best_fitness
+        population.add_reporter(checkpointer)
+
     # Add a custom generation counter
-    generation_counter = {"gen": 0}
+    generation_counter = {"gen": population.generation}
 
     # Custom reporter for saving genomes
     class SaveEveryTwoGenerations(neat.reporting.BaseReporter):
@@ -213,21 +296,151 @@ def run_neat(n_iterations=10000):
 
             # Save every 2 generations no matter what
             if gen % 1000 == 0:
-                save_genome(best_genome, gen)
+                save_genome(best_genome, gen, config=config, decision_interval=decision_interval)
 
     # Add the custom reporter
     population.add_reporter(SaveEveryTwoGenerations())
 
+    # Shared-memory feed for live_viewer.py; costs nothing while no viewer is attached
+    live_buffer = LiveBuffer.create(config.pop_size, n_enemies, name=live_name) if live else None
+
+    # Fixed seeds replay the same episodes every generation
+    seeds = list(range(n_seeds)) if fixed_seeds else None
+
+    # Headless evaluation, across worker processes if requested
+    if workers:
+        evaluate_headless = ShardedEvaluator(workers, config, n_seeds=n_seeds, aggregate=aggregate,
+                                             max_frames=max_frames, time_budget=time_budget,
+                                             live_name=live_buffer and live_buffer.shm.name,
+                                             seeds=seeds, sensors=sensors, decision_interval=decision_interval,
+                                             n_enemies=n_enemies).evaluate
+    else:
+        evaluate_headless = partial(evaluate_genomes, n_seeds=n_seeds, aggregate=aggregate,
+                                    max_frames=max_frames, time_budget=time_budget, live=live_buffer,
+                                    seeds=seeds, sensors=sensors, decision_interval=decision_interval,
+                                    n_enemies=n_enemies)
+
+    # With deterministic episodes, elites and clones are not re-simulated
+    cache = None
+    if fixed_seeds and cache_size and time_budget is None:
+        context = (seeds, n_enemies, max_frames, aggregate, sensors, decision_interval)
+        cache = FitnessCache(evaluate_headless, context, max_size=cache_size)
+
+    # Render only every render_every generations (never if None); record an
+    # episode trace every record_every generations for replay.py
+    def evaluate(genomes, config):
+        generation = population.generation
+        record = bool(record_every) and generation % record_every == 0
+        if live_buffer is not None:
+            live_buffer.set_generation(generation)
+        if render_every and generation % render_every == 0:
+            trace = train_genomes(genomes, config, sim_hz=sim_hz, display_hz=display_hz, n_enemies=n_enemies,
+                                  max_frames=max_frames, time_budget=time_budget, n_seeds=n_seeds,
+                                  aggregate=aggregate, record=record, heatmap_top=heatmap_top, timer=timer,
+                                  seeds=seeds, sensors=sensors, decision_interval=decision_interval)
+        elif cache is not None and not record:
+            trace = cache(genomes, config, timer=timer)
+        else:
+            # A recorded episode shows the whole population, cached or not
+            trace = evaluate_headless(genomes, config, record=record, timer=timer)
+            if cache is not None:
+                cache.remember(genomes)
+        if trace is not None:
+            trace.generation = generation
+            os.makedirs(record_dir, exist_ok=True)
+            trace.save(os.path.join(record_dir, f"trace-gen-{generation}.npz"))
+
     # Run NEAT
-    winner = population.run(train_genomes, n_iterations)
+    winner = population.run(evaluate, n_iterations)
+    if checkpointer:
+        checkpointer.close()
+    if live_buffer is not None:
+        live_buffer.close()
+    stats.close()
+    if cache is not None:
+        print(f"Fitness cache: {cache.hits} genomes reused, {cache.misses} simulated")
 
     print("\n🏆 Best overall AI achieved.")
-    save_genome(winner, generation_counter["gen"], filename_prefix="final_best_genome")
+    save_genome(winner, generation_counter["gen"], filename_prefix="final_best_genome", config=config,
+                decision_interval=decision_interval)
     return winner
 
 
 
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+
 if __name__ == "__main__":
-    pygame.init()
-    run_neat()
+    parser = argparse.ArgumentParser(description="Train the Avoid Cubes AI with NEAT")
+    parser.add_argument("--generations", type=int, default=10000)
+    parser.add_argument("--headless", action="store_true",
+                        help="no display, no frame cap, no drawing")
+    parser.add_argument("--render-every", type=int, default=None,
+                        help="render one generation out of every N (implies --headless otherwise)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="evaluate headless generations across N processes")
+    parser.add_argument("--enemies", type=int, default=MAX_ENEMIES,
+                        help="number of enemies; the network gets 2 + 3 * N inputs")
+    parser.add_argument("--max-frames", type=int, default=None,
+                        help="end each episode after N frames; survivors keep their fitness")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="wall-clock seconds allowed per generation's episode")
+    parser.add_argument("--seeds", type=int, default=1,
+                        help="evaluate every genome on N enemy seeds, batched in one pass")
+    parser.add_argument("--fixed-seeds", action="store_true",
+                        help="play the same episodes every generation; unchanged genomes are not re-simulated")
+    parser.add_argument("--cache-size", type=int, default=10000,
+                        help="genomes whose fitness is kept with --fixed-seeds (0 disables the cache)")
+    parser.add_argument("--aggregate", choices=["mean", "min"], default="mean",
+                        help="how fitness over the seeds is combined")
+    parser.add_argument("--checkpoint-every", type=int, default=None,
+                        help="write a full population checkpoint every N generations")
+    parser.add_argument("--checkpoint-dir", default="checkpoints")
+    parser.add_argument("--checkpoint-keep", type=int, default=3,
+                        help="number of most recent checkpoints to keep")
+    parser.add_argument("--resume", default=None,
+                        help="checkpoint file to continue from, or 'latest'")
+    parser.add_argument("--record-every", type=int, default=None,
+                        help="save an episode trace every N generations (play it with replay.py)")
+    parser.add_argument("--record-dir", default="traces")
+    parser.add_argument("--live", action="store_true",
+                        help="publish headless generations for live_viewer.py")
+    parser.add_argument("--live-name", default=DEFAULT_NAME,
+                        help="shared memory block to publish to (live_viewer.py --name)")
+    parser.add_argument("--sim-hz", type=positive_int, default=None,
+                        help="game ticks per second when rendering (default: uncapped)")
+    parser.add_argument("--display-hz", type=positive_int, default=60,
+                        help="presented frames per second when rendering")
+    parser.add_argument("--heatmap-top", type=int, default=None,
+                        help="draw only the N fittest players, the rest as a density heatmap")
+    parser.add_argument("--profile", action="store_true",
+                        help="report where each generation's time goes")
+    parser.add_argument("--sensors", action="store_true",
+                        help="add gap and ray-cast inputs computed once per frame (changes the network inputs)")
+    parser.add_argument("--decision-interval", type=positive_int, default=1,
+                        help="activate the networks every N frames, repeating the last move in between")
+    parser.add_argument("--stats-dir", default="stats",
+                        help="directory the per-generation statistics are written to "
+                        "(replaced by a fresh run, continued by --resume)")
+    parser.add_argument("--print-interval", type=float, default=5.0,
+                        help="seconds between console progress lines")
+    args = parser.parse_args()
+
+    render_every = args.render_every or (None if args.headless else 1)
+    if render_every:
+        pygame.init()
+    run_neat(args.generations, workers=args.workers, render_every=render_every,
+             sim_hz=args.sim_hz, display_hz=args.display_hz, n_enemies=args.enemies,
+             max_frames=args.max_frames, time_budget=args.time_budget, n_seeds=args.seeds,
+             aggregate=args.aggregate, checkpoint_every=args.checkpoint_every,
+             checkpoint_dir=args.checkpoint_dir, checkpoint_keep=args.checkpoint_keep, resume=args.resume,
+             record_every=args.record_every, record_dir=args.record_dir, live=args.live,
+             heatmap_top=args.heatmap_top, profile=args.profile, stats_dir=args.stats_dir,
+             print_interval=args.print_interval, fixed_seeds=args.fixed_seeds, cache_size=args.cache_size,
+             sensors=args.sensors, decision_interval=args.decision_interval,
+             live_name=args.live_name)
     pygame.quit()
@@ -2,6 +2,15 @@ import pygame
 import random
 import neat
 import os
+import argparse
+import numpy as np
+
+from collision import SweepIndex
+from evaluation import set_num_inputs
+from population_net import build_network
+from profiling import PhaseTimer, PhaseReporter, NULL_TIMER
+from stream_stats import StreamingStatsReporter
+from rendering import sprite, CachedText, DirtyLayer, Heatmap, top_k
 
 # ---------------------- CONSTANTS ----------------------
 SCREEN_WIDTH = 720
@@ -29,9 +38,7 @@ class Player:
         return dx, dy
 
     def draw(self, screen, alpha=60):
-        player_surface = pygame.Surface((self.player_width, self.player_height), pygame.SRCALPHA)
-        player_surface.fill((0, 255, 0, alpha))
-        screen.blit(player_surface, (self.rect.x, self.rect.y))
+        screen.blit(sprite(self.player_width, self.player_height, (0, 255, 0), alpha), (self.rect.x, self.rect.y))
 
 # ---------------------- ENEMIES ----------------------
 class Enemy1:
@@ -100,124 +107,195 @@ class Reward:
         pygame.draw.rect(screen, (0, 0, 255), self.rect)
 
 # ---------------------- NEAT EVALUATION ----------------------
-def eval_genomes(genomes, config):
-    nets = []
-    ge = []
-    players = []
-
-    for genome_id, genome in genomes:
-        net = neat.nn.FeedForwardNetwork.create(genome, config)
-        nets.append(net)
-        players.append(Player())
-        genome.fitness = 0
-        ge.append(genome)
-
-    enemy1 = [Enemy1() for _ in range(3)]
-    enemy2 = [Enemy2() for _ in range(3)]
+def round_rect(v):
+    # pygame.Rect rounds float coordinates half away from zero
+    return np.trunc(v + np.copysign(0.5, v)).astype(np.int64)
+
+
+def eval_genomes(genomes, config, render=True, heatmap_top=None, n_enemies=6, max_frames=None, timer=NULL_TIMER):
+    # Returns the number of frames simulated
+    timer.start()
+    ge = [genome for genome_id, genome in genomes]
+    nets = [build_network(genome, config) for genome in ge]
+    timer.lap("network creation")
+
+    # Players as arrays with an alive mask instead of Player objects that are
+    # popped on death; a frame is linear in the number of live players
+    template = Player()
+    player_x = np.full(len(ge), template.rect.x, dtype=np.int64)
+    player_y = np.full(len(ge), template.rect.y, dtype=np.int64)
+    prev_distance = np.full(len(ge), np.nan)
+    fitness = np.zeros(len(ge))
+    alive = np.ones(len(ge), dtype=bool)
+
+    # Half the enemies fall from the top, half cross from the left
+    enemy1 = [Enemy1() for _ in range((n_enemies + 1) // 2)]
+    enemy2 = [Enemy2() for _ in range(n_enemies // 2)]
     border = Border(thickness=50)
+    border_index = SweepIndex.from_rects(border.rects)
     reward = Reward(border_thickness=border.thickness)
 
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    clock = pygame.time.Clock()
-    pygame.display.set_caption("NEAT AI Training")
-
-    generation_font = pygame.font.Font(None, 30)
+    # Headless runs skip the display, drawing and the 60 FPS cap entirely
+    if render:
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        clock = pygame.time.Clock()
+        pygame.display.set_caption("NEAT AI Training")
+
+        generation_font = pygame.font.Font(None, 30)
+        text_gen = CachedText(generation_font, (255, 255, 255))
+        text_alive = CachedText(generation_font, (0, 255, 0))
+
+        # Static border in the background, sprites pre-rendered and blitted in batches
+        background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        border.draw(background)
+        layer = DirtyLayer(screen, background)
+        enemy_image = sprite(30, 30, (255, 0, 0))
+        reward_image = sprite(10, 10, (0, 0, 255))
+        best_image = sprite(template.player_width, template.player_height, (0, 255, 0), 200)
+
+        # Heatmap mode: only the heatmap_top fittest players are drawn
+        heatmap = Heatmap((0, 0, SCREEN_WIDTH, SCREEN_HEIGHT), cell=12) if heatmap_top is not None else None
     generation = getattr(eval_genomes, "generation", 0)
 
     run = True
-    while run and len(players) > 0:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                run = False
-                pygame.quit()
-                quit()
-
-        screen.fill((0, 0, 0))
-        reward.draw(screen)
-        border.draw(screen)
-
-        for enemy in enemy1 + enemy2:
+    frame = 0
+    while run and alive.any() and (max_frames is None or frame < max_frames):
+        frame += 1
+        if render:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    run = False
+                    pygame.quit()
+                    quit()
+
+            layer.clear()
+            layer.blit(reward_image, reward.rect.topleft)
+
+        enemies = enemy1 + enemy2
+        for enemy in enemies:
             enemy.move()
-            enemy.draw(screen)
-
-        for x in range(len(players) - 1, -1, -1):
-            player = players[x]
-
+        if render:
+            layer.draw(enemy_image, [e.rect.x for e in enemies], [e.rect.y for e in enemies])
+
+        # Enemy inputs and the collision index are shared by every player this frame
+        enemy_inputs = []
+        for enemy in enemies:
+            enemy_inputs.append(enemy.rect.x / SCREEN_WIDTH)
+            enemy_inputs.append(enemy.rect.y / SCREEN_HEIGHT)
+        enemy_index = SweepIndex.from_rects([enemy.rect for enemy in enemies])
+        timer.lap("movement")
+
+        # Live players, last first as before. Collecting the reward respawns
+        # it for the players after, so the network, move and reward test stay
+        # a per-player loop; the rest of the frame is vectorised below.
+        rows = np.flatnonzero(alive)[::-1]
+        highlight = fitness[rows] == fitness[rows].max()
+        n = len(rows)
+        reward_x, reward_y = np.empty(n, dtype=np.int64), np.empty(n, dtype=np.int64)
+        dx, dy = np.empty(n), np.empty(n)
+        hit_border = np.zeros(n, dtype=bool)
+        hit_reward = np.zeros(n, dtype=bool)
+        probe = template.rect.copy()
+
+        xs, ys = player_x[rows].tolist(), player_y[rows].tolist()
+        for i, x in enumerate(rows.tolist()):
             # --- INPUTS: player, reward, all enemies ---
             inputs = [
-                player.rect.x / SCREEN_WIDTH,
-                player.rect.y / SCREEN_HEIGHT,
+                xs[i] / SCREEN_WIDTH,
+                ys[i] / SCREEN_HEIGHT,
                 reward.rect.x / SCREEN_WIDTH,
                 reward.rect.y / SCREEN_HEIGHT
-            ]
-            for enemy in enemy1 + enemy2:
-                inputs.append(enemy.rect.x / SCREEN_WIDTH)
-                inputs.append(enemy.rect.y / SCREEN_HEIGHT)
+            ] + enemy_inputs
 
             output = nets[x].activate(inputs)
-            dx, dy = player.move_ai(output)
-
-            # Highlight best AI
-            best_fitness = max(g.fitness for g in ge)
-            if ge[x].fitness == best_fitness:
-                player.draw(screen, alpha=200)
-            else:
-                player.draw(screen, alpha=60)
-
-            # --- FITNESS SHAPING ---
-            ge[x].fitness += 3
-            current_distance = ((player.rect.x - reward.rect.x)**2 + (player.rect.y - reward.rect.y)**2)**0.5
-            if player.prev_distance is None:
-                player.prev_distance = current_distance
-            distance_change = player.prev_distance - current_distance
-            ge[x].fitness += 1 if distance_change > 0 else -1
-            player.prev_distance = current_distance
-
-            if abs(dx) + abs(dy) > 0.1:
-                ge[x].fitness += 0.05
-
-            # --- BORDER COLLISION ---
-            if any(player.rect.colliderect(r) for r in border.rects):
-                ge[x].fitness -= 10
-                players.pop(x)
-                nets.pop(x)
-                ge.pop(x)
-                continue
-
-            # --- REWARD COLLISION ---
-            if player.rect.colliderect(reward.rect):
-                ge[x].fitness += 10
+            dx[i] = (output[1] - output[0]) * template.speed
+            dy[i] = (output[3] - output[2]) * template.speed
+            probe.topleft = (xs[i] + dx[i], ys[i] + dy[i])
+            reward_x[i], reward_y[i] = reward.rect.x, reward.rect.y
+
+            # --- BORDER / REWARD COLLISION ---
+            if border_index.first_hit(probe) >= 0:
+                hit_border[i] = True
+            elif probe.colliderect(reward.rect):
+                hit_reward[i] = True
                 reward = Reward(border_thickness=border.thickness)
-
-            # --- ENEMY COLLISION ---
-            collided_enemy = False
-            for enemy in enemy1 + enemy2:
-                if player.rect.colliderect(enemy.rect):
-                    ge[x].fitness -= 15
-                    players.pop(x)
-                    nets.pop(x)
-                    ge.pop(x)
-                    collided_enemy = True
-                    break
-            if collided_enemy:
-                continue
+        # One lap for the whole loop: per-player laps would cost more than
+        # the split is worth
+        timer.lap("player loop")
+
+        player_x[rows] = round_rect(player_x[rows] + dx)
+        player_y[rows] = round_rect(player_y[rows] + dy)
+        px, py = player_x[rows], player_y[rows]
+        timer.lap("movement")
+
+        # Highlight best AI (same colour, so blending order does not matter)
+        if render and heatmap is not None:
+            top = top_k(fitness[rows], heatmap_top)
+            rest = np.ones(n, dtype=bool)
+            rest[top] = False
+            density = heatmap.render(px[rest] + template.player_width // 2, py[rest] + template.player_height // 2)
+            if density is not None:
+                layer.blit(*density)
+            layer.draw(best_image, px[top].tolist(), py[top].tolist())
+        elif render:
+            w, h = template.player_width, template.player_height
+            layer.draw_stacked(w, h, (0, 255, 0), 60, px[~highlight], py[~highlight])
+            layer.draw_stacked(w, h, (0, 255, 0), 200, px[highlight], py[highlight])
+        if render:
+            timer.lap("render")
+
+        # --- FITNESS SHAPING ---
+        f = fitness[rows] + 3
+        current_distance = ((px - reward_x) ** 2 + (py - reward_y) ** 2) ** 0.5
+        previous = np.where(np.isnan(prev_distance[rows]), current_distance, prev_distance[rows])
+        f += np.where(previous - current_distance > 0, 1, -1)
+        prev_distance[rows] = current_distance
+        f += np.where(np.abs(dx) + np.abs(dy) > 0.1, 0.05, 0)
+
+        f -= np.where(hit_border, 10, 0)
+        f += np.where(hit_reward, 10, 0)
+        timer.lap("fitness")
+
+        # --- ENEMY COLLISION ---
+        hit_enemy = ~hit_border & enemy_index.overlaps(px, py, template.player_width, template.player_height)
+        f -= np.where(hit_enemy, 15, 0)
+        fitness[rows] = f
+        alive[rows[hit_border | hit_enemy]] = False
+        timer.lap("collision")
+        timer.count(n)
 
         # --- HUD ---
-        text_gen = generation_font.render(f"Generation: {generation}", True, (255, 255, 255))
-        text_alive = generation_font.render(f"Alive: {len(players)}", True, (0, 255, 0))
-        screen.blit(text_gen, (10, 10))
-        screen.blit(text_alive, (10, 40))
+        if render:
+            layer.blit(text_gen.render(f"Generation: {generation}"), (10, 10))
+            layer.blit(text_alive.render(f"Alive: {int(alive.sum())}"), (10, 40))
 
-        pygame.display.flip()
-        clock.tick(60)
+            layer.present()
+            timer.lap("render")
+            clock.tick(60)
+            timer.lap("frame wait")
+
+    for genome, value in zip(ge, fitness.tolist()):
+        genome.fitness = value
+    return frame
 
 # ---------------------- NEAT RUNNER ----------------------
-def run_neat(config_path, n_iterations=1000):
+def fit_config(config, n_enemies=6):
+    # The shipped config is shaped for main.py; this game feeds the player and
+    # reward positions plus (x, y) per enemy, and has 4 move outputs
+    set_num_inputs(config, 4 + 2 * n_enemies)
+    genome_config = config.genome_config
+    genome_config.num_outputs = 4
+    genome_config.output_keys = list(range(4))
+
+
+def run_neat(config_path, n_iterations=1000, render_every=1, heatmap_top=None, profile=False,
+             stats_dir="stats-two-enemies"):
     eval_genomes.generation = 0
 
     def wrapped_eval(genomes, config):
         eval_genomes.generation += 1
-        eval_genomes(genomes, config)
+        render = bool(render_every) and eval_genomes.generation % render_every == 0
+        eval_genomes(genomes, config, render=render, heatmap_top=heatmap_top, timer=timer)
 
     config = neat.Config(
         neat.DefaultGenome,
@@ -226,19 +304,43 @@ def run_neat(config_path, n_iterations=1000):
         neat.DefaultStagnation,
         config_path
     )
+    fit_config(config)
 
     population = neat.Population(config)
-    population.add_reporter(neat.StdOutReporter(True))
-    stats = neat.StatisticsReporter()
+    stats = StreamingStatsReporter(stats_dir)
     population.add_reporter(stats)
 
+    # Per-phase timing of every generation
+    timer = PhaseTimer() if profile else NULL_TIMER
+    if profile:
+        population.add_reporter(PhaseReporter(timer))
+
     winner = population.run(wrapped_eval, n_iterations)
+    stats.close()
     print("\nBest AI achieved!")
     return winner
 
 # ---------------------- MAIN ----------------------
 if __name__ == "__main__":
-    pygame.init()
+    parser = argparse.ArgumentParser(description="Train the two-enemy NEAT scenario")
+    parser.add_argument("--generations", type=int, default=1000)
+    parser.add_argument("--headless", action="store_true",
+                        help="no display, no frame cap, no drawing")
+    parser.add_argument("--render-every", type=int, default=None,
+                        help="render one generation out of every N (implies --headless otherwise)")
+    parser.add_argument("--heatmap-top", type=int, default=None,
+                        help="draw only the N fittest players, the rest as a density heatmap")
+    parser.add_argument("--profile", action="store_true",
+                        help="print where each generation's time goes, phase by phase")
+    parser.add_argument("--stats-dir", default="stats-two-enemies",
+                        help="directory the per-generation statistics are written to "
+                        "(replaced on every run)")
+    args = parser.parse_args()
+
+    render_every = args.render_every or (None if args.headless else 1)
+    if render_every:
+        pygame.init()
     local_dir = os.path.dirname(__file__)
     config_path = os.path.join(local_dir, "config-feedforward.txt")
-    run_neat(config_path, n_iterations=1000)
+    run_neat(config_path, n_iterations=args.generations, render_every=render_every,
+             heatmap_top=args.heatmap_top, profile=args.profile, stats_dir=args.stats_dir)
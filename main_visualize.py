@@ -4,6 +4,14 @@ import neat
 import math
 import pickle
 import os
+import argparse
+
+from evaluation import evaluate_genomes, new_episodes
+from live import LiveBuffer, DEFAULT_NAME
+from population_net import build_network
+from profiling import NULL_TIMER
+from rendering import sprite, CachedText, DirtyLayer
+from stream_stats import StreamingStatsReporter
 
 
 SCREEN_WIDTH, SCREEN_HEIGHT = 720, 720
@@ -83,16 +91,28 @@ class Enemy:
 
 
 # ---------------- Neural Network Visualizer ---------------- #
+# Node layout and connection lines depend only on the genome, so they are
+# rendered once per genome into a cached surface; a frame blits that surface
+# and recolours the nodes from the network's own node values.
 class NeuralNetworkVisualizer:
     def __init__(self, screen, genome, config, pos=(500, 80), size=(200, 500)):
         self.screen = screen
-        self.genome = genome
         self.config = config
         self.pos = pos
         self.size = size
+        self.margin = 10
+        self._layouts = {}
+        self.set_genome(genome)
+
+    def set_genome(self, genome):
+        # Switch the displayed genome; layouts are kept per genome key
+        self.genome = genome
+        if genome.key not in self._layouts:
+            self._layouts[genome.key] = self._build_layout(genome)
+        self.surface, self.nodes = self._layouts[genome.key]
 
-    def draw_network(self, activations):
-        x, y = self.pos
+    def _build_layout(self, genome):
+        x, y = self.margin, self.margin
         w, h = self.size
         node_positions = {}
 
@@ -111,7 +131,7 @@ class NeuralNetworkVisualizer:
             node_positions[nid] = (x + w, y + spacing_y * (i + 1))
 
         # Hidden nodes
-        hidden_nodes = [n for n in self.genome.nodes.keys()
+        hidden_nodes = [n for n in genome.nodes.keys()
                         if n not in input_nodes and n not in output_nodes]
         if hidden_nodes:
             spacing_y = h / (len(hidden_nodes) + 1)
@@ -119,7 +139,10 @@ class NeuralNetworkVisualizer:
                 node_positions[nid] = (x + w / 2, y + spacing_y * (i + 1))
 
         # Draw connections
-        for key, conn in self.genome.connections.items():
+        # Black is transparent; RLE makes the mostly empty surface cheap to blit
+        surface = pygame.Surface((w + 2 * self.margin, h + 2 * self.margin))
+        surface.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+        for key, conn in genome.connections.items():
             if not conn.enabled:
                 continue
             n1, n2 = key
@@ -130,23 +153,31 @@ class NeuralNetworkVisualizer:
             weight = conn.weight
             color = (0, 255, 0) if weight > 0 else (255, 0, 0)
             thickness = max(1, int(abs(weight) * 2))
-            pygame.draw.line(self.screen, color, (x1, y1), (x2, y2), thickness)
+            pygame.draw.line(surface, color, (x1, y1), (x2, y2), thickness)
 
-        # Draw nodes
+        # Nodes as (id, screen position, colour channel)
+        ox, oy = self.pos[0] - self.margin, self.pos[1] - self.margin
+        nodes = []
         for nid, (nx, ny) in node_positions.items():
+            channel = 1 if nid in input_nodes else 0 if nid in output_nodes else 2
+            nodes.append((nid, (int(ox + nx), int(oy + ny)), channel))
+        return surface, nodes
+
+    def draw_network(self, layer, activations):
+        # activations: node id -> value, e.g. FeedForwardNetwork.values. The
+        # panel blit marks its whole area dirty, nodes included.
+        layer.blit(self.surface, (self.pos[0] - self.margin, self.pos[1] - self.margin))
+        for nid, center, channel in self.nodes:
             activation = activations.get(nid, 0)
             brightness = int(255 * min(1, max(0, (activation + 1) / 2)))
-            if nid in input_nodes:
-                color = (0, brightness, 0)
-            elif nid in output_nodes:
-                color = (brightness, 0, 0)
-            else:
-                color = (0, 0, brightness)
-            pygame.draw.circle(self.screen, color, (int(nx), int(ny)), 8)
+            color = [0, 0, 0]
+            color[channel] = brightness
+            pygame.draw.circle(self.screen, color, center, 8)
 
 
 # ---------------- NEAT Training ---------------- #
-def train_genomes(genomes, config):
+def train_genomes(genomes, config, n_enemies=MAX_ENEMIES, max_frames=None, display_hz=60, timer=NULL_TIMER):
+    # Returns the number of frames simulated, None if the window was closed
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Avoid Cubes (NEAT) - Improved")
     clock = pygame.time.Clock()
@@ -155,43 +186,65 @@ def train_genomes(genomes, config):
     border_thickness = 20
     border = Border(border_thickness)
 
+    # Borders are drawn once into the background; enemies are a pre-rendered
+    # sprite and the players, all on one row, are filled as merged spans
+    background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    border.draw(background)
+    layer = DirtyLayer(screen, background)
+    score_text = CachedText(font, (200, 150, 50))
+
     # Prepare genome/network/player lists
     nets, ge, players = [], [], []
 
+    timer.start()
     for genome_id, genome in genomes:
-        net = neat.nn.FeedForwardNetwork.create(genome, config)
+        net = build_network(genome, config)
         nets.append(net)
         players.append(Player(border_thickness=border_thickness))
         genome.fitness = 0
         ge.append(genome)
 
-    # Visualizer for the best genome (first in list)
+    # Visualizer for the best live genome, starting with the first
     visualizer = NeuralNetworkVisualizer(screen, ge[0], config)
+    timer.lap("network creation")
 
-    # Fixed enemies
+    # Enemies are read from a seeded tape, and players spawn from the same
+    # episode, as in every other evaluator
     initial_speed = 10
-    enemies = [Enemy(border_thickness=border_thickness, speed=initial_speed) for _ in range(MAX_ENEMIES)]
+    tapes, player_x = new_episodes(len(players), border_thickness=border_thickness, n_enemies=n_enemies,
+                                   initial_speed=initial_speed)
+    tape = tapes[0]
+    for player, x in zip(players, player_x[0].tolist()):
+        player.rect.x = x
+    enemies = [Enemy(border_thickness=border_thickness, speed=initial_speed) for _ in range(n_enemies)]
+    enemy_image = sprite(enemies[0].enemy_width, enemies[0].enemy_height, enemies[0].enemy_color)
+    # Players only move along x, so the first one gives the row and size of all
+    template = players[0]
 
     survival_time = 0
     active_players = [True for _ in players]
 
-    while any(active_players):
-        screen.fill((0, 0, 0))
-        border.draw(screen)
+    while any(active_players) and (max_frames is None or survival_time < max_frames):
+        layer.clear()
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 return
+        timer.count(sum(active_players))
 
-        # Move and draw enemies
-        for enemy in enemies:
-            enemy.move()
-            enemy.draw(screen)
+        # Move and draw enemies; the tape carries the speed ramp
+        for enemy, (x, y, speed) in zip(enemies, tape.frame(survival_time).tolist()):
+            enemy.rect.x, enemy.rect.y, enemy.enemy_speed = x, y, speed
+        layer.draw(enemy_image, [e.rect.x for e in enemies], [e.rect.y for e in enemies])
 
-        best_idx = 0  # we'll visualize this one's network
-        best_activations = {}
+        # Visualize the fittest live genome (the first one until fitness is earned)
+        best_idx = max((i for i, active in enumerate(active_players) if active),
+                       key=lambda i: ge[i].fitness)
+        if ge[best_idx] is not visualizer.genome:
+            visualizer.set_genome(ge[best_idx])
 
-        # Move players
+        # Move players; everyone who moved is drawn, even if they die this frame
+        drawn_x = []
         for idx, player in enumerate(players):
             if not active_players[idx]:
                 continue
@@ -210,13 +263,7 @@ def train_genomes(genomes, config):
             # Activate NN
             outputs = nets[idx].activate(inputs)
             player.move_ai(outputs)
-            player.draw(screen)
-
-            # Store activations for visualizer if this is the best one
-            if idx == best_idx:
-                # Build a simple activation dict for coloring (approximation)
-                best_activations = {i: val for i, val in enumerate(inputs)}
-                best_activations.update({100 + i: outputs[i] for i in range(len(outputs))})
+            drawn_x.append(player.rect.x)
 
             # --- Fitness function ---
             ge[idx].fitness += 0.1  # survival reward
@@ -245,23 +292,30 @@ def train_genomes(genomes, config):
                     active_players[idx] = False
                     break
 
-        # Gradually increase enemy speed
+        timer.lap("simulation")
+
         survival_time += 1
-        for enemy in enemies:
-            enemy.enemy_speed = min(25, initial_speed + survival_time // 300)
+        layer.fill_row(template.player_color, drawn_x, template.rect.y, template.player_width,
+                       template.player_height)
 
         # Display survival time
-        score_text = font.render(f"Survival Time: {survival_time // 60}s", True, (200, 150, 50))
-        screen.blit(score_text, (border_thickness + 5, border_thickness + 5))
+        layer.blit(score_text.render(f"Survival Time: {survival_time // 60}s"),
+                   (border_thickness + 5, border_thickness + 5))
+
+        # Draw best network visualization with the values of its last activation
+        visualizer.draw_network(layer, nets[best_idx].values)
 
-        # Draw best network visualization
-        visualizer.draw_network(best_activations)
+        layer.present()
+        timer.lap("render")
+        if display_hz:
+            clock.tick(display_hz)
+        timer.lap("frame wait")
 
-        pygame.display.flip()
-        clock.tick(60)
+    return survival_time
 
 
-def run_neat(n_iterations=10000):
+def run_neat(n_iterations=10000, render_every=1, live=False, stats_dir="stats-visualize",
+             live_name=DEFAULT_NAME):
     config_file_path = 'config-feedforward.txt'
     config = neat.Config(
         neat.DefaultGenome,
@@ -272,16 +326,48 @@ def run_neat(n_iterations=10000):
     )
 
     population = neat.Population(config)
-    population.add_reporter(neat.StdOutReporter(True))
-    stats = neat.StatisticsReporter()
+    stats = StreamingStatsReporter(stats_dir)
     population.add_reporter(stats)
 
-    winner = population.run(train_genomes, n_iterations)
+    # Headless generations can be watched from live_viewer.py instead
+    live_buffer = LiveBuffer.create(config.pop_size, MAX_ENEMIES, name=live_name) if live else None
+
+    # Render (with the network view) only every render_every generations
+    def evaluate(genomes, config):
+        if render_every and population.generation % render_every == 0:
+            train_genomes(genomes, config)
+        else:
+            if live_buffer is not None:
+                live_buffer.set_generation(population.generation)
+            evaluate_genomes(genomes, config, live=live_buffer)
+
+    winner = population.run(evaluate, n_iterations)
+    stats.close()
+    if live_buffer is not None:
+        live_buffer.close()
     print("\nBest AI achieved.")
     return winner
 
 
 if __name__ == "__main__":
-    pygame.init()
-    run_neat()
+    parser = argparse.ArgumentParser(description="Train the Avoid Cubes AI with a live network view")
+    parser.add_argument("--generations", type=int, default=10000)
+    parser.add_argument("--headless", action="store_true",
+                        help="no display, no frame cap, no drawing")
+    parser.add_argument("--render-every", type=int, default=None,
+                        help="render one generation out of every N (implies --headless otherwise)")
+    parser.add_argument("--live", action="store_true",
+                        help="publish headless generations for live_viewer.py")
+    parser.add_argument("--live-name", default=DEFAULT_NAME,
+                        help="shared memory block to publish to (live_viewer.py --name)")
+    parser.add_argument("--stats-dir", default="stats-visualize",
+                        help="directory the per-generation statistics are written to "
+                        "(replaced on every run)")
+    args = parser.parse_args()
+
+    render_every = args.render_every or (None if args.headless else 1)
+    if render_every:
+        pygame.init()
+    run_neat(args.generations, render_every=render_every, live=args.live, stats_dir=args.stats_dir,
+             live_name=args.live_name)
     pygame.quit()
@@ -0,0 +1,348 @@
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import neat
+from neat.graphs import feed_forward_layers
+
+
+# Genomes deeper than this (long chains from node_add_prob) are evaluated
+# one by one with neat.nn.FeedForwardNetwork instead of the batched path.
+MAX_BATCHED_DEPTH = 8
+
+# Flat description of one genome's feed-forward network.
+#   node_keys / node_levels   evaluated nodes in layer order and their layer
+#   bias / response           per evaluated node
+#   activation / aggregation  per evaluated node (names, as in the genome)
+#   conn_src / conn_dst / conn_weight   enabled links into evaluated nodes
+GenomePlan = namedtuple("GenomePlan", [
+    "input_keys", "output_keys", "node_keys", "node_levels", "bias", "response",
+    "activation", "aggregation", "conn_src", "conn_dst", "conn_weight",
+])
+
+
+# ---------------- Layering cache ---------------- #
+# feed_forward_layers only looks at which nodes are fed by some input and at
+# the links between non-input nodes; which input feeds a node, and all the
+# weights, make no difference. Genomes of a generation mostly differ in
+# weights and input links, so their layering is looked up by that reduced
+# structure instead of being recomputed (an LRU of max_size structures).
+class LayerCache:
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def layers(self, input_keys, output_keys, connections):
+        # Layers of node keys, each sorted, as feed_forward_layers would give
+        inputs = set(input_keys)
+        fed = frozenset([b for a, b in connections if a in inputs])
+        inner = frozenset([key for key in connections if key[0] not in inputs])
+        key = (tuple(output_keys), fed, inner)
+        layers = self.entries.get(key)
+        if layers is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return layers
+
+        self.misses += 1
+        layers = [sorted(layer) for layer in feed_forward_layers(input_keys, output_keys, connections)]
+        self.entries[key] = layers
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return layers
+
+
+LAYER_CACHE = LayerCache()
+
+
+# ---------------- Genome compilation ---------------- #
+def build_network(genome, config, cache=LAYER_CACHE):
+    # Same network as neat.nn.FeedForwardNetwork.create (each node sums its
+    # inputs in the same order), with the layering taken from the cache
+    gc = config.genome_config
+    connections = [cg.key for cg in genome.connections.values() if cg.enabled]
+    layers = cache.layers(gc.input_keys, gc.output_keys, connections)
+
+    incoming = {node: [] for layer in layers for node in layer}
+    for cg in genome.connections.values():
+        if cg.enabled and cg.key[1] in incoming:
+            incoming[cg.key[1]].append((cg.key[0], cg.weight))
+
+    node_evals = []
+    for layer in layers:
+        for node in layer:
+            ng = genome.nodes[node]
+            node_evals.append((node, gc.activation_defs.get(ng.activation),
+                               gc.aggregation_function_defs.get(ng.aggregation),
+                               ng.bias, ng.response, incoming[node]))
+    return neat.nn.FeedForwardNetwork(gc.input_keys, gc.output_keys, node_evals)
+
+
+def compile_genome(genome, config, cache=LAYER_CACHE):
+    gc = config.genome_config
+    connections = [cg.key for cg in genome.connections.values() if cg.enabled]
+    layers = cache.layers(gc.input_keys, gc.output_keys, connections)
+
+    node_keys, node_levels = [], []
+    for level, layer in enumerate(layers):
+        node_keys += layer
+        node_levels += [level] * len(layer)
+
+    evaluated = set(node_keys)
+    links = [key for key in connections if key[1] in evaluated]
+    nodes = [genome.nodes[k] for k in node_keys]
+
+    return GenomePlan(
+        input_keys=list(gc.input_keys),
+        output_keys=list(gc.output_keys),
+        node_keys=np.array(node_keys, dtype=np.int64),
+        node_levels=np.array(node_levels, dtype=np.int64),
+        bias=np.array([n.bias for n in nodes], dtype=np.float64),
+        response=np.array([n.response for n in nodes], dtype=np.float64),
+        activation=[n.activation for n in nodes],
+        aggregation=[n.aggregation for n in nodes],
+        conn_src=np.array([k[0] for k in links], dtype=np.int64),
+        conn_dst=np.array([k[1] for k in links], dtype=np.int64),
+        conn_weight=np.array([genome.connections[k].weight for k in links], dtype=np.float64),
+    )
+
+
+def plan_depth(plan):
+    # Nodes are stored in level order
+    return int(plan.node_levels[-1]) + 1 if len(plan.node_levels) else 0
+
+
+def is_batchable(plan, max_depth=MAX_BATCHED_DEPTH):
+    return (plan_depth(plan) <= max_depth and
+            all(a == "tanh" for a in plan.activation) and
+            all(a == "sum" for a in plan.aggregation))
+
+
+def plan_to_network(plan, config):
+    # Rebuild a neat.nn.FeedForwardNetwork from a plan (used for fallbacks)
+    gc = config.genome_config
+    incoming = {}
+    for src, dst, w in zip(plan.conn_src.tolist(), plan.conn_dst.tolist(), plan.conn_weight.tolist()):
+        incoming.setdefault(dst, []).append((src, w))
+    node_evals = []
+    for i, node in enumerate(plan.node_keys.tolist()):
+        node_evals.append((node,
+                           gc.activation_defs.get(plan.activation[i]),
+                           gc.aggregation_function_defs.get(plan.aggregation[i]),
+                           float(plan.bias[i]), float(plan.response[i]),
+                           incoming.get(node, [])))
+    return neat.nn.FeedForwardNetwork(plan.input_keys, plan.output_keys, node_evals)
+
+
+# ---------------- Compact genome files ---------------- #
+# A plan saved as flat arrays in an .npz, loadable with allow_pickle=False and
+# without neat's object graph. header = [format version, generation,
+# num inputs, num outputs, decision interval]; fitness is stored next to it.
+# Files saved before the decision interval was recorded were run at 1.
+PLAN_FORMAT_VERSION = 1
+
+
+def save_plan(plan, path, fitness=None, generation=-1, decision_interval=1):
+    np.savez(path,
+             header=np.array([PLAN_FORMAT_VERSION, generation, len(plan.input_keys), len(plan.output_keys),
+                              decision_interval], dtype=np.int64),
+             fitness=np.array(np.nan if fitness is None else fitness, dtype=np.float64),
+             input_keys=np.array(plan.input_keys, dtype=np.int64),
+             output_keys=np.array(plan.output_keys, dtype=np.int64),
+             node_keys=plan.node_keys, node_levels=plan.node_levels,
+             bias=plan.bias, response=plan.response,
+             activation=np.array(plan.activation, dtype=str),
+             aggregation=np.array(plan.aggregation, dtype=str),
+             conn_src=plan.conn_src, conn_dst=plan.conn_dst, conn_weight=plan.conn_weight)
+
+
+def save_genome_npz(genome, config, path, generation=-1, decision_interval=1):
+    save_plan(compile_genome(genome, config), path, fitness=genome.fitness, generation=generation,
+              decision_interval=decision_interval)
+
+
+def load_plan(path):
+    # Returns (plan, info) where info has the generation, fitness and decision
+    # interval it was saved with
+    with np.load(path, allow_pickle=False) as data:
+        header = data["header"].tolist()
+        version, generation = header[:2]
+        if version != PLAN_FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported genome file version {version}")
+        fitness = float(data["fitness"])
+        plan = GenomePlan(
+            input_keys=data["input_keys"].tolist(),
+            output_keys=data["output_keys"].tolist(),
+            node_keys=data["node_keys"],
+            node_levels=data["node_levels"],
+            bias=data["bias"],
+            response=data["response"],
+            activation=data["activation"].tolist(),
+            aggregation=data["aggregation"].tolist(),
+            conn_src=data["conn_src"],
+            conn_dst=data["conn_dst"],
+            conn_weight=data["conn_weight"],
+        )
+    return plan, {"generation": generation, "fitness": None if np.isnan(fitness) else fitness,
+                  "decision_interval": header[4] if len(header) > 4 else 1}
+
+
+# ---------------- Batched population network ---------------- #
+# Every genome of a generation is packed into padded per-level arrays:
+#   value slots  [inputs | outputs | hidden | scratch]
+#   weights[l]   (genomes, slots, nodes at level l)
+# so a frame for the whole population is one matmul + tanh per level.
+#
+# repeat=K lays the population out K times (row = k * len(plans) + genome),
+# for evaluating every genome on K episodes in the same pass.
+class PopulationNetwork:
+    def __init__(self, plans, config, max_depth=MAX_BATCHED_DEPTH, dtype=np.float32, repeat=1):
+        self.config = config
+        self.dtype = dtype
+        self.n_plans = len(plans)
+        self.n_genomes = len(plans) * repeat
+        self.n_inputs = len(config.genome_config.input_keys)
+        self.n_outputs = len(config.genome_config.output_keys)
+
+        batchable = [is_batchable(p, max_depth) for p in plans]
+        batched = [i for i, ok in enumerate(batchable) if ok]
+        self.fallback_rows = np.array([i for i, ok in enumerate(batchable) if not ok], dtype=np.int64)
+        self.fallback_nets = {int(i): plan_to_network(plans[i], config) for i in self.fallback_rows}
+
+        # Position of each row inside the batched arrays (-1 for fallbacks)
+        batch_index = np.full(len(plans), -1, dtype=np.int64)
+        batch_index[batched] = np.arange(len(batched))
+        self._pack([plans[i] for i in batched])
+        self.batch_index = np.concatenate([np.where(batch_index >= 0, batch_index + k * len(batched), -1)
+                                           for k in range(repeat)])
+        if repeat > 1:
+            for arrays in (self.weights, self.biases, self.responses, self.targets):
+                arrays[:] = [np.concatenate([a] * repeat) for a in arrays]
+        self._active = None
+
+    @classmethod
+    def create(cls, genomes, config, **kwargs):
+        return cls([compile_genome(g, config) for g in genomes], config, **kwargs)
+
+    @classmethod
+    def load(cls, paths, config, **kwargs):
+        # Pack a set of saved .npz genomes (e.g. for a tournament or a replay)
+        return cls([load_plan(path)[0] for path in paths], config, **kwargs)
+
+    def _pack(self, plans):
+        # Vectorised over the nodes and links of every plan at once: each node
+        # gets a value slot (inputs, outputs, then hidden nodes in plan order)
+        # and a column m among the nodes of its level in its genome
+        gc = self.config.genome_config
+        n_in, n_out = self.n_inputs, self.n_outputs
+        n_nodes = np.array([len(p.node_keys) for p in plans], dtype=np.int64)
+        n_links = np.array([len(p.conn_src) for p in plans], dtype=np.int64)
+        n_hidden = int(n_nodes.max()) if len(plans) else 0
+        self.n_slots = n_slots = n_in + n_out + n_hidden
+        scratch = n_slots
+
+        def concat(field, dtype):
+            return np.concatenate([np.asarray(getattr(p, field), dtype=dtype) for p in plans] +
+                                  [np.zeros(0, dtype=dtype)])
+
+        node_plan = np.repeat(np.arange(len(plans)), n_nodes)
+        node_keys = concat("node_keys", np.int64)
+        levels = concat("node_levels", np.int64)
+        depth = int(levels.max()) + 1 if len(levels) else 0
+
+        # Slots: outputs by their position in output_keys, hidden nodes after
+        # them in the order they appear in their plan
+        output_keys = np.array(gc.output_keys, dtype=np.int64)
+        output_order = np.argsort(output_keys)
+        out_pos = np.searchsorted(output_keys[output_order], node_keys)
+        out_pos = np.minimum(out_pos, max(n_out - 1, 0))
+        is_output = output_keys[output_order][out_pos] == node_keys if n_out else np.zeros(len(node_keys), bool)
+        hidden = (~is_output).astype(np.int64)
+        hidden_before = np.cumsum(hidden) - hidden
+        plan_start = np.cumsum(n_nodes) - n_nodes
+        rank = hidden_before - hidden_before[plan_start][node_plan] if len(node_keys) else hidden_before
+        slot = np.where(is_output, n_in + output_order[out_pos], n_in + n_out + rank)
+
+        # Nodes of a plan are in level order, so (plan, level) groups are runs
+        new_group = np.ones(len(node_keys), dtype=bool)
+        new_group[1:] = (node_plan[1:] != node_plan[:-1]) | (levels[1:] != levels[:-1])
+        group_start = np.flatnonzero(new_group)
+        column = np.arange(len(node_keys)) - group_start[np.cumsum(new_group) - 1]
+        level_width = np.zeros(depth, dtype=np.int64)
+        np.maximum.at(level_width, levels, column + 1)
+
+        self.weights = [np.zeros((len(plans), n_slots, m), dtype=self.dtype) for m in level_width]
+        self.biases = [np.zeros((len(plans), m), dtype=self.dtype) for m in level_width]
+        self.responses = [np.zeros((len(plans), m), dtype=self.dtype) for m in level_width]
+        self.targets = [np.full((len(plans), m), scratch, dtype=np.int64) for m in level_width]
+        bias, response = concat("bias", np.float64), concat("response", np.float64)
+        for level in range(depth):
+            at = levels == level
+            self.biases[level][node_plan[at], column[at]] = bias[at]
+            self.responses[level][node_plan[at], column[at]] = response[at]
+            self.targets[level][node_plan[at], column[at]] = slot[at]
+
+        # Links: find the (plan, key) of both ends among the nodes; inputs
+        # take their position in input_keys
+        link_plan = np.repeat(np.arange(len(plans)), n_links)
+        src, dst = concat("conn_src", np.int64), concat("conn_dst", np.int64)
+        weight = concat("conn_weight", np.float64)
+        if not len(src):
+            return
+        low = min(node_keys.min(), src.min())
+        span = max(node_keys.max(), src.max()) - low + 1
+        node_id = node_plan * span + (node_keys - low)
+        order = np.argsort(node_id)
+
+        def lookup(keys):
+            return order[np.minimum(np.searchsorted(node_id[order], link_plan * span + (keys - low)),
+                                    len(order) - 1)]
+
+        input_keys = np.array(gc.input_keys, dtype=np.int64)
+        input_order = np.argsort(input_keys)
+        in_pos = np.minimum(np.searchsorted(input_keys[input_order], src), n_in - 1)
+        from_input = input_keys[input_order][in_pos] == src
+        src_slot = np.where(from_input, input_order[in_pos], slot[lookup(src)])
+        to = lookup(dst)
+        for level in range(depth):
+            at = levels[to] == level
+            self.weights[level][link_plan[at], src_slot[at], column[to][at]] = weight[at]
+
+    def _gather(self, rows):
+        # Cache the packed arrays for the current live set; the live set only
+        # shrinks during an episode, so re-gather when it has shrunk enough
+        if self._active is not None and len(rows) > 0.75 * len(self._active[0]):
+            cached_rows = self._active[0]
+            pos = np.searchsorted(cached_rows, rows)
+            if np.array_equal(cached_rows[np.minimum(pos, len(cached_rows) - 1)], rows):
+                return self._active, pos
+        self._active = (rows,
+                        [w[rows] for w in self.weights],
+                        [b[rows] for b in self.biases],
+                        [r[rows] for r in self.responses],
+                        [t[rows] for t in self.targets])
+        return self._active, np.arange(len(rows))
+
+    def activate(self, inputs, rows=None):
+        # inputs: (len(rows), n_inputs) observations for the given genome rows
+        inputs = np.asarray(inputs)
+        if rows is None:
+            rows = np.arange(self.n_genomes)
+        rows = np.asarray(rows, dtype=np.int64)
+        outputs = np.zeros((len(rows), self.n_outputs), dtype=np.float64)
+
+        batch = self.batch_index[rows]
+        batched = batch >= 0
+        if batched.any():
+            (active, weights, biases, responses, targets), pos = self._gather(batch[batched])
+            values = np.zeros((len(active), self.n_slots + 1), dtype=self.dtype)
+            values[pos, :self.n_inputs] = inputs[batched]
+            for w, b, r, t in zip(weights, biases, responses, targets):
+                z = b + r * np.matmul(values[:, None, :self.n_slots], w)[:, 0, :]
+                np.put_along_axis(values, t, np.tanh(np.clip(2.5 * z, -60.0, 60.0)), axis=1)
+            outputs[batched] = values[pos, self.n_inputs:self.n_inputs + self.n_outputs]
+
+        for i in np.flatnonzero(~batched):
+            outputs[i] = self.fallback_nets[int(rows[i]) % self.n_plans].activate(inputs[i].tolist())
+        return outputs
@@ -0,0 +1,94 @@
+import time
+
+import neat
+
+
+# ---------------- Phase timers ---------------- #
+# timer.lap(phase) charges the time since the previous lap (or start) to
+# phase, so a hot path is instrumented with one call after each stage.
+# timer.count(n) adds the genome-frames simulated. NULL_TIMER has the same
+# methods doing nothing and is the default everywhere.
+class PhaseTimer:
+    enabled = True
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.totals = {}
+        self.frames = 0
+        self.last = time.perf_counter()
+
+    def start(self):
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.totals[phase] = self.totals.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    def count(self, genome_frames):
+        self.frames += genome_frames
+
+    def merge(self, totals, frames):
+        # Add phase times measured elsewhere (e.g. in a worker process)
+        for phase, seconds in totals.items():
+            self.totals[phase] = self.totals.get(phase, 0.0) + seconds
+        self.frames += frames
+
+
+class NullTimer:
+    enabled = False
+
+    def reset(self):
+        pass
+
+    def start(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def count(self, genome_frames):
+        pass
+
+    def merge(self, totals, frames):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+# Prints each generation's phase split. Evaluation phases come from the
+# timer handed to the evaluator; NEAT's own reproduction and speciation are
+# timed here, between post_evaluate and end_generation. Sharded runs add up
+# the phases of every worker, so the shares are of CPU time, not wall time.
+class PhaseReporter(neat.reporting.BaseReporter):
+    def __init__(self, timer, show_every=1):
+        self.timer = timer
+        self.show_every = show_every
+        self.generation = None
+        self.generation_start = None
+        self.evaluated = None
+
+    def start_generation(self, generation):
+        self.generation = generation
+        self.timer.reset()
+        self.generation_start = time.perf_counter()
+
+    def post_evaluate(self, config, population, species, best_genome):
+        self.evaluated = time.perf_counter()
+
+    def end_generation(self, config, population, species_set):
+        now = time.perf_counter()
+        if self.evaluated is not None:
+            self.timer.totals["reproduction"] = self.timer.totals.get("reproduction", 0.0) + now - self.evaluated
+        if self.generation % self.show_every:
+            return
+
+        wall = now - self.generation_start
+        measured = sum(self.timer.totals.values())
+        rate = self.timer.frames / wall if wall > 0 else 0.0
+        print(f"Phase timing: {wall:.3f} s, {self.timer.frames} genome-frames, {rate:,.0f} genome-frames/s")
+        for phase, seconds in sorted(self.timer.totals.items(), key=lambda item: -item[1]):
+            print(f"    {phase:<18} {100 * seconds / measured:5.1f}%  {seconds:.3f} s")
@@ -0,0 +1,119 @@
+import numpy as np
+
+
+# ---------------- Episode traces ---------------- #
+# One recorded episode, compact enough to keep one per generation:
+#   player_x   (frames + 1, players) int16, DEAD_X once a player is out
+#   enemy_x/y  (frames + 1, enemies) int16
+#   outputs    (frames, players) uint8, bit 0 = left, bit 1 = right
+#   fitness    (players,) episode fitness, genome_keys (players,)
+# Row 0 is the spawn state and row f + 1 the state after frame f. Player y
+# never changes, so it is kept in the header with the rest of the layout,
+# as is the decision interval the networks were run at (traces from before
+# it was recorded were all made at 1).
+TRACE_FORMAT_VERSION = 1
+DEAD_X = np.iinfo(np.int16).min
+
+
+class Trace:
+    def __init__(self, player_x, enemy_x, enemy_y, outputs, fitness, genome_keys, player_y,
+                 border_thickness=20, generation=-1, decision_interval=1):
+        self.player_x = player_x
+        self.enemy_x = enemy_x
+        self.enemy_y = enemy_y
+        self.outputs = outputs
+        self.fitness = fitness
+        self.genome_keys = genome_keys
+        self.player_y = player_y
+        self.border_thickness = border_thickness
+        self.generation = generation
+        self.decision_interval = decision_interval
+
+    @property
+    def n_frames(self):
+        return len(self.player_x) - 1
+
+    @property
+    def n_players(self):
+        return self.player_x.shape[1]
+
+    @property
+    def n_enemies(self):
+        return self.enemy_x.shape[1]
+
+    def alive(self, frame):
+        return self.player_x[frame] != DEAD_X
+
+    @classmethod
+    def concat(cls, traces):
+        # Join traces of the same episode recorded over different players
+        # (one per evaluation shard); shorter ones are padded with dead players
+        n = max(t.n_frames for t in traces)
+        longest = max(traces, key=lambda t: t.n_frames)
+        player_x = np.full((n + 1, sum(t.n_players for t in traces)), DEAD_X, dtype=np.int16)
+        outputs = np.zeros((n, player_x.shape[1]), dtype=np.uint8)
+        start = 0
+        for t in traces:
+            player_x[:t.n_frames + 1, start:start + t.n_players] = t.player_x
+            outputs[:t.n_frames, start:start + t.n_players] = t.outputs
+            start += t.n_players
+        return cls(player_x, longest.enemy_x, longest.enemy_y, outputs,
+                   np.concatenate([t.fitness for t in traces]),
+                   np.concatenate([t.genome_keys for t in traces]),
+                   longest.player_y, longest.border_thickness, longest.generation, longest.decision_interval)
+
+    def save(self, path):
+        np.savez_compressed(path,
+                            header=np.array([TRACE_FORMAT_VERSION, self.player_y, self.border_thickness,
+                                             self.generation, self.decision_interval], dtype=np.int64),
+                            player_x=self.player_x, enemy_x=self.enemy_x, enemy_y=self.enemy_y,
+                            outputs=self.outputs, fitness=self.fitness, genome_keys=self.genome_keys)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            header = data["header"].tolist()
+            version, player_y, border_thickness, generation = header[:4]
+            if version != TRACE_FORMAT_VERSION:
+                raise ValueError(f"{path}: unsupported trace version {version}")
+            return cls(data["player_x"], data["enemy_x"], data["enemy_y"], data["outputs"],
+                       data["fitness"], data["genome_keys"], player_y, border_thickness, generation,
+                       header[4] if len(header) > 4 else 1)
+
+
+# Collects one episode of a World while it is being evaluated. Only the
+# first len(genome_keys) rows of the chosen episode are recorded.
+class EpisodeRecorder:
+    def __init__(self, world, genome_keys, episode=0, generation=-1):
+        self.rows = episode * world.n_players + np.arange(len(genome_keys))
+        self.episode = episode
+        self.genome_keys = np.asarray(genome_keys, dtype=np.int64)
+        self.player_y = int(world.player_y[0])
+        self.border_thickness = world.border_thickness
+        self.generation = generation
+        self.decision_interval = world.decision_interval
+        self.player_x, self.enemy_x, self.enemy_y, self.outputs = [], [], [], []
+        self._snapshot(world)
+
+    def _snapshot(self, world):
+        self.player_x.append(np.where(world.alive[self.rows], world.player_x[self.rows], DEAD_X).astype(np.int16))
+        self.enemy_x.append(world.enemy_x[self.episode].astype(np.int16))
+        self.enemy_y.append(world.enemy_y[self.episode].astype(np.int16))
+
+    def record(self, world, outputs):
+        # After step_episode: only players alive at the start of the frame acted
+        moves = (outputs[self.rows] > 0.5).astype(np.uint8)
+        acted = self.player_x[-1] != DEAD_X
+        self.outputs.append(np.where(acted, moves[:, 0] | (moves[:, 1] << 1), 0).astype(np.uint8))
+        self._snapshot(world)
+
+    def finish(self, fitness):
+        # fitness: the whole world's fitness array
+        n = len(self.rows)
+        return Trace(np.array(self.player_x, dtype=np.int16).reshape(-1, n),
+                     np.array(self.enemy_x, dtype=np.int16),
+                     np.array(self.enemy_y, dtype=np.int16),
+                     np.array(self.outputs, dtype=np.uint8).reshape(-1, n),
+                     np.asarray(fitness, dtype=np.float32)[self.rows],
+                     self.genome_keys, self.player_y, self.border_thickness, self.generation,
+                     self.decision_interval)
@@ -0,0 +1,222 @@
+import time
+
+import numpy as np
+import pygame
+
+
+# ---------------- Fixed-timestep loop ---------------- #
+# Decouples game ticks from presented frames. With sim_hz=None the game runs
+# as fast as it can and a frame is presented every 1 / display_hz seconds,
+# skipping the ticks in between. With a sim_hz the game runs at that fixed
+# rate and alpha() says how far the display is between the last two ticks.
+class FixedTimestep:
+    def __init__(self, sim_hz=None, display_hz=60, max_steps_per_frame=10):
+        if display_hz <= 0 or (sim_hz is not None and sim_hz < 0):
+            raise ValueError(f"rates must be positive, got sim_hz={sim_hz}, display_hz={display_hz}")
+        self.sim_dt = 1.0 / sim_hz if sim_hz else None
+        self.present_dt = 1.0 / display_hz
+        self.max_steps_per_frame = max_steps_per_frame
+        self.accumulator = 0.0
+        self.last = time.perf_counter()
+        self.next_present = self.last + self.present_dt
+
+    def steps(self):
+        # Yields once per game tick due before the next presented frame
+        if self.sim_dt is None:
+            yield
+            while time.perf_counter() < self.next_present:
+                yield
+            return
+
+        now = time.perf_counter()
+        self.accumulator += now - self.last
+        self.last = now
+        steps = 0
+        while self.accumulator >= self.sim_dt:
+            self.accumulator -= self.sim_dt
+            steps += 1
+            yield
+            if steps == self.max_steps_per_frame:
+                # Too slow to keep up; drop the backlog instead of spiralling
+                self.accumulator = 0.0
+                break
+
+    def alpha(self):
+        if self.sim_dt is None:
+            return 1.0
+        return min(1.0, self.accumulator / self.sim_dt)
+
+    def wait(self):
+        # Sleep until the next presented frame when the game is rate-capped
+        now = time.perf_counter()
+        if self.sim_dt is not None and now < self.next_present:
+            time.sleep(self.next_present - now)
+        self.next_present = max(self.next_present + self.present_dt, now)
+
+
+def interpolate(previous, current, alpha, snap=None):
+    # Blend two position arrays; entries where the boolean mask snap is set
+    # (jumps such as enemy respawns) take the current position instead
+    previous, current = previous.astype(float), current.astype(float)
+    blended = previous + (current - previous) * alpha
+    if snap is not None:
+        blended[snap] = current[snap]
+    return blended.astype(int)
+
+
+# ---------------- Sprite drawing ---------------- #
+# Solid and translucent rectangles are pre-rendered once and reused, so a
+# frame is one Surface.blits call per sprite kind instead of a draw call (or
+# a new SRCALPHA surface) per object.
+_sprites = {}
+
+
+def sprite(width, height, color, alpha=None):
+    key = (width, height, tuple(color), alpha)
+    if key not in _sprites:
+        if alpha is None:
+            surface = pygame.Surface((width, height))
+            surface.fill(color)
+        else:
+            surface = pygame.Surface((width, height), pygame.SRCALPHA)
+            surface.fill((*color, alpha))
+        _sprites[key] = surface
+    return _sprites[key]
+
+
+def merge_spans(xs, width):
+    # Union of the intervals [x, x + width) as sorted (start, end) pairs. Opaque
+    # sprites of one size on one row can be filled span by span: a crowd of
+    # overlapping players becomes a few rects.
+    xs = np.unique(np.asarray(xs))
+    if not len(xs):
+        return []
+    breaks = np.flatnonzero(np.diff(xs) > width)
+    starts = xs[np.r_[0, breaks + 1]]
+    ends = xs[np.r_[breaks, len(xs) - 1]] + width
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+class CachedText:
+    # Re-renders a HUD line only when its text changes
+    def __init__(self, font, color, antialias=True):
+        self.font = font
+        self.color = color
+        self.antialias = antialias
+        self.text = None
+        self.surface = None
+
+    def render(self, text):
+        if text != self.text:
+            self.text = text
+            self.surface = self.font.render(text, self.antialias, self.color)
+        return self.surface
+
+
+# Dirty-rect presentation. Static scenery (borders) is drawn once into a
+# background; each frame only the areas last covered by sprites are restored
+# from it and only the old + new sprite areas are sent to the display.
+class DirtyLayer:
+    def __init__(self, screen, background, max_rects=256):
+        self.screen = screen
+        self.background = background
+        self.max_rects = max_rects
+        self.previous = []
+        self.current = []
+        self.full = True
+        screen.blit(background, (0, 0))
+
+    def clear(self):
+        # Erase last frame's sprites; once they cover about half the screen
+        # one full background blit is cheaper than many overlapping ones
+        if sum(r.w * r.h for r in self.previous) > self.screen.get_width() * self.screen.get_height() // 2:
+            self.screen.blit(self.background, (0, 0))
+        elif self.previous:
+            self.screen.blits([(self.background, r, r) for r in self.previous], doreturn=False)
+
+    def draw(self, surface, xs, ys):
+        # Blit one sprite at every (x, y)
+        rects = self.screen.blits([(surface, (x, y)) for x, y in zip(xs, ys)])
+        self.current.extend(rects)
+
+    def draw_stacked(self, width, height, color, alpha, xs, ys):
+        # Translucent same-colour sprites: k of them on one spot are blitted
+        # once with the alpha that k blends add up to
+        xs, ys = np.asarray(xs, dtype=np.int64), np.asarray(ys, dtype=np.int64)
+        if not len(xs):
+            return
+        spots, counts = np.unique(np.stack([xs, ys], axis=1), axis=0, return_counts=True)
+        stacked = np.rint(255 * (1 - (1 - alpha / 255) ** counts)).astype(np.int64).tolist()
+        rects = self.screen.blits([(sprite(width, height, color, a), (x, y))
+                                   for (x, y), a in zip(spots.tolist(), stacked)])
+        self.current.extend(rects)
+
+    def fill_row(self, color, xs, y, width, height):
+        # Opaque width x height rects at every x of one row (see merge_spans)
+        self.current.extend(self.screen.fill(color, (start, y, end - start, height))
+                            for start, end in merge_spans(xs, width))
+
+    def blit(self, surface, position):
+        self.current.append(self.screen.blit(surface, position))
+
+    def present(self):
+        if self.full:
+            pygame.display.flip()
+            self.full = False
+        else:
+            rects = self.previous + self.current
+            if len(rects) > self.max_rects:
+                # Many small rects cost more than one covering rect
+                rects = [rects[0].unionall(rects[1:])]
+            if rects:
+                pygame.display.update(rects)
+        self.previous, self.current = self.current, []
+
+
+# ---------------- Population heatmap ---------------- #
+# For large populations: player centres are binned with np.histogram2d over a
+# screen region and the counts written straight into a surface with
+# surfarray, scaled up and blitted once. Only the bounding box of occupied
+# cells is drawn; empty cells are transparent.
+class Heatmap:
+    def __init__(self, region, cell=8, color=(0, 255, 0)):
+        # cell: bin size in pixels, or (width, height)
+        self.region = pygame.Rect(region)
+        self.cell = (cell, cell) if np.isscalar(cell) else tuple(cell)
+        nx = max(1, self.region.width // self.cell[0])
+        ny = max(1, self.region.height // self.cell[1])
+        self.edges = (self.region.left + self.cell[0] * np.arange(nx + 1),
+                      self.region.top + self.cell[1] * np.arange(ny + 1))
+        # Dim colour for one player, brightening towards white for crowds
+        t = np.linspace(0.2, 1.0, 256)[:, None]
+        color = np.asarray(color, dtype=np.float64)
+        self.palette = np.clip(color * np.minimum(2 * t, 1) + (255 - color) * np.clip(2 * t - 1, 0, 1),
+                               0, 255).astype(np.uint8)
+        self.palette[0] = 0
+
+    def render(self, xs, ys):
+        # Returns (surface, topleft), or None when no player is in the region
+        counts, _, _ = np.histogram2d(xs, ys, bins=self.edges)
+        occupied_x = np.flatnonzero(counts.any(axis=1))
+        occupied_y = np.flatnonzero(counts.any(axis=0))
+        if not len(occupied_x):
+            return None
+        i0, i1 = occupied_x[0], occupied_x[-1] + 1
+        j0, j1 = occupied_y[0], occupied_y[-1] + 1
+        counts = counts[i0:i1, j0:j1]
+
+        # Log scale, so a single straggler is still visible next to a crowd
+        level = 1 + np.rint(254 * np.log1p(counts) / np.log1p(counts.max())).astype(np.int64)
+        level[counts == 0] = 0
+        small = pygame.surfarray.make_surface(self.palette[level])
+        surface = pygame.transform.scale(small, ((i1 - i0) * self.cell[0], (j1 - j0) * self.cell[1]))
+        surface.set_colorkey((0, 0, 0))
+        return surface, (int(self.edges[0][i0]), int(self.edges[1][j0]))
+
+
+def top_k(values, k):
+    # Indices of the k largest values, best first
+    if k >= len(values):
+        return np.argsort(-values, kind="stable")
+    top = np.argpartition(-values, k)[:k]
+    return top[np.argsort(-values[top], kind="stable")]
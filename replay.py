@@ -0,0 +1,118 @@
+import argparse
+
+import numpy as np
+import pygame
+
+from main import Player, Border, Enemy, SCREEN_WIDTH, SCREEN_HEIGHT
+from recording import Trace
+from rendering import sprite, CachedText, DirtyLayer, Heatmap, top_k
+
+
+GAME_HZ = 60   # game ticks per second of play, as shown by the survival timer
+
+
+# ---------------- Trace playback ---------------- #
+# Plays a trace recorded with main.py --record-every. Controls:
+#   space         pause / resume
+#   left / right  seek 1 s (10 s with shift)
+#   up / down     double / halve the speed
+#   home / end    jump to the start / end
+def play(trace, speed=1.0, start=0, display_hz=60, heatmap_top=None):
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Avoid Cubes - Replay")
+    font = pygame.font.SysFont(None, 28)
+    clock = pygame.time.Clock()
+
+    background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    Border(trace.border_thickness).draw(background)
+    layer = DirtyLayer(screen, background)
+    player = Player(border_thickness=trace.border_thickness)
+    enemy = Enemy(border_thickness=trace.border_thickness)
+    enemy_image = sprite(enemy.enemy_width, enemy.enemy_height, enemy.enemy_color)
+    best_image = sprite(player.player_width, player.player_height, (0, 160, 255))
+    hud_text = CachedText(font, (200, 150, 50))
+    best = int(np.argmax(trace.fitness)) if trace.n_players else -1
+
+    # Heatmap mode: the heatmap_top players with the best final fitness are
+    # drawn, the rest binned along their row
+    heatmap = top = None
+    if heatmap_top is not None:
+        heatmap = Heatmap((0, trace.player_y, SCREEN_WIDTH, player.player_height), cell=(8, player.player_height))
+        top = np.zeros(trace.n_players, dtype=bool)
+        top[top_k(trace.fitness, heatmap_top)] = True
+
+    frame = float(min(max(start, 0), trace.n_frames))
+    paused = False
+    while True:
+        dt = clock.tick(display_hz) / 1000.0
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return
+            if event.type != pygame.KEYDOWN:
+                continue
+            step = GAME_HZ * (10 if event.mod & pygame.KMOD_SHIFT else 1)
+            if event.key == pygame.K_SPACE:
+                paused = not paused
+            elif event.key == pygame.K_LEFT:
+                frame -= step
+            elif event.key == pygame.K_RIGHT:
+                frame += step
+            elif event.key == pygame.K_UP:
+                speed *= 2
+            elif event.key == pygame.K_DOWN:
+                speed /= 2
+            elif event.key == pygame.K_HOME:
+                frame = 0
+            elif event.key == pygame.K_END:
+                frame = trace.n_frames
+            elif event.key == pygame.K_ESCAPE:
+                return
+
+        if not paused:
+            frame += dt * GAME_HZ * speed
+        frame = min(max(frame, 0.0), float(trace.n_frames))
+        f = int(frame)
+
+        layer.clear()
+        layer.draw(enemy_image, trace.enemy_x[f].tolist(), trace.enemy_y[f].tolist())
+
+        alive = trace.alive(f)
+        if heatmap is not None:
+            rest = trace.player_x[f][alive & ~top]
+            density = heatmap.render(rest + player.player_width // 2,
+                                     np.full(len(rest), trace.player_y + player.player_height // 2))
+            if density is not None:
+                layer.blit(*density)
+            layer.fill_row(player.player_color, trace.player_x[f][alive & top], trace.player_y,
+                           player.player_width, player.player_height)
+        else:
+            layer.fill_row(player.player_color, trace.player_x[f][alive], trace.player_y,
+                           player.player_width, player.player_height)
+        # Best genome of the episode drawn on top in its own colour
+        if best >= 0 and alive[best]:
+            layer.blit(best_image, (int(trace.player_x[f, best]), trace.player_y))
+
+        hud = (f"Gen {trace.generation}  Frame {f}/{trace.n_frames}  Time {f // GAME_HZ}s  "
+               f"Alive {int(alive.sum())}/{trace.n_players}  Speed x{speed:g}" + ("  (paused)" if paused else ""))
+        layer.blit(hud_text.render(hud), (trace.border_thickness + 5, trace.border_thickness + 5))
+        layer.present()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play back an episode trace recorded during training")
+    parser.add_argument("trace", help="trace .npz written by main.py --record-every")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="playback speed relative to real time")
+    parser.add_argument("--start", type=int, default=0, help="first frame to show")
+    parser.add_argument("--display-hz", type=int, default=60)
+    parser.add_argument("--heatmap-top", type=int, default=None,
+                        help="draw only the N fittest players, the rest as a density heatmap")
+    args = parser.parse_args()
+
+    trace = Trace.load(args.trace)
+    print(f"{args.trace}: generation {trace.generation}, {trace.n_players} players, "
+          f"{trace.n_enemies} enemies, {trace.n_frames} frames, best fitness {trace.fitness.max():.3f}, "
+          f"decisions every {trace.decision_interval} frames")
+    pygame.init()
+    play(trace, speed=args.speed, start=args.start, display_hz=args.display_hz, heatmap_top=args.heatmap_top)
+    pygame.quit()
@@ -0,0 +1,127 @@
+import numpy as np
+
+from simulation import SCREEN_WIDTH, SCREEN_HEIGHT, PLAYER_SIZE, ENEMY_SIZE
+
+
+# ---------------- Frame sensors ---------------- #
+# Extra network inputs built from structures computed once per frame and
+# episode, so their cost does not grow with players x enemies:
+#
+#   gaps     enemies within `lookahead` px above the player row, projected
+#            on x, sorted and merged; the free stretches between them (and
+#            the walls) are the gaps. O(E log E) per episode.
+#   rays     enemies that have not passed the row, sorted by left edge,
+#            with a table of maxima of their bottoms over runs of 2^j
+#            consecutive enemies. O(E log E) per episode.
+#
+# Every player then reads, in one vectorised step:
+#   nearest gap the player fits in: centre offset, width
+#   widest gap: centre offset, width
+#   rays straight up at RAY_OFFSETS from the player centre: free distance
+#   to the lowest enemy crossing the ray's x
+# A ray's enemies have their left edge within ENEMY_SIZE px of it, one
+# contiguous run of the sorted enemies found with two binary searches,
+# whose maximum is two table lookups. Offsets and widths are
+# / SCREEN_WIDTH, distances / SCREEN_HEIGHT; a ray outside the walls reads 0.
+RAY_OFFSETS = np.array([-2, -1, 0, 1, 2]) * PLAYER_SIZE
+LOOKAHEAD = SCREEN_HEIGHT // 2
+SENSOR_SIZE = 4 + len(RAY_OFFSETS)
+
+# Gap and ray keys are episode * _SPAN + x, so one sorted array serves all episodes
+_SPAN = 4 * SCREEN_WIDTH
+
+
+class FrameSensors:
+    size = SENSOR_SIZE
+
+    def __init__(self, lookahead=LOOKAHEAD):
+        self.lookahead = lookahead
+        self.frame = None
+
+    def update(self, world):
+        bt = world.border_thickness
+        x = world.enemy_x.astype(np.int64)
+        y = world.enemy_y.astype(np.int64)
+        n_episodes = len(x)
+        self.row_top = row_top = int(world.player_y[0])
+
+        # Gaps: enemies outside the band become empty intervals at the left wall
+        ahead = (y < row_top + PLAYER_SIZE) & (y + ENEMY_SIZE > row_top - self.lookahead)
+        start = np.where(ahead, x, bt)
+        order = np.argsort(start, axis=1)
+        start = np.take_along_axis(start, order, axis=1)
+        end = np.take_along_axis(np.where(ahead, x + ENEMY_SIZE, bt), order, axis=1)
+        reach = np.maximum.accumulate(end, axis=1)
+        left = np.concatenate([np.full((n_episodes, 1), bt), reach], axis=1)
+        right = np.concatenate([start, np.full((n_episodes, 1), SCREEN_WIDTH - bt)], axis=1)
+        width = right - left
+        center = (left + right) / 2
+
+        widest = np.argmax(width, axis=1)
+        episodes = np.arange(n_episodes)
+        self.widest_center = center[episodes, widest]
+        self.widest_width = width[episodes, widest]
+
+        # Gaps are in x order within an episode, so the flattened keys are sorted
+        fits = width >= PLAYER_SIZE
+        self.has_gap = fits.any(axis=1)
+        self.gap_keys = (episodes[:, None] * _SPAN + center)[fits]
+        self.gap_center = center[fits]
+        self.gap_width = width[fits]
+
+        # Rays: enemies above the row by left edge; row j of the table holds
+        # the lowest bottom among enemies i .. i + 2^j - 1 (0 past the end)
+        above = y < row_top + PLAYER_SIZE
+        keys = (episodes[:, None] * _SPAN + x)[above]
+        order = np.argsort(keys, kind="stable")
+        self.ray_keys = keys[order]
+        bottom = (y + ENEMY_SIZE)[above][order]
+        table = np.zeros((max(world.n_enemies, 1).bit_length(), len(bottom)), dtype=np.int64)
+        table[0] = bottom
+        for j in range(1, len(table)):
+            half = 1 << (j - 1)
+            table[j, :len(bottom) - half] = np.maximum(table[j - 1, :len(bottom) - half], table[j - 1, half:])
+        self.ray_table = table
+        self.frame = world.survival_time
+
+    def features(self, world, rows, out):
+        # Writes the SENSOR_SIZE features of the given players into out
+        if self.frame != world.survival_time:
+            self.update(world)
+        episode = world.episode[rows]
+        cx = world.player_x[rows] + PLAYER_SIZE // 2
+
+        if len(self.gap_keys):
+            query = episode * _SPAN + cx
+            i = np.searchsorted(self.gap_keys, query)
+            below = np.maximum(i - 1, 0)
+            above = np.minimum(i, len(self.gap_keys) - 1)
+            nearest = np.where(np.abs(self.gap_keys[above] - query) < np.abs(self.gap_keys[below] - query),
+                               above, below)
+            has_gap = self.has_gap[episode]
+            out[:, 0] = np.where(has_gap, (self.gap_center[nearest] - cx) / SCREEN_WIDTH, 0.0)
+            out[:, 1] = np.where(has_gap, self.gap_width[nearest] / SCREEN_WIDTH, 0.0)
+        else:
+            out[:, :2] = 0.0
+        out[:, 2] = (self.widest_center[episode] - cx) / SCREEN_WIDTH
+        out[:, 3] = self.widest_width[episode] / SCREEN_WIDTH
+
+        bt = world.border_thickness
+        ray_x = cx[:, None] + RAY_OFFSETS
+        inside = (ray_x >= bt) & (ray_x < SCREEN_WIDTH - bt)
+        query = episode[:, None] * _SPAN + ray_x
+        lo = np.searchsorted(self.ray_keys, query - ENEMY_SIZE, side="right")
+        hi = np.searchsorted(self.ray_keys, query, side="right")
+        count = hi - lo
+        j = np.zeros(count.shape, dtype=np.int64)
+        for k in range(1, len(self.ray_table)):
+            j += count >= (1 << k)
+        table = self.ray_table
+        if table.shape[1]:
+            last = np.maximum(hi - (1 << j), 0)
+            lowest = np.maximum(table[j, np.minimum(lo, table.shape[1] - 1)], table[j, last])
+            lowest = np.where(count > 0, lowest, 0)
+        else:
+            lowest = np.zeros(count.shape, dtype=np.int64)
+        free = np.maximum(self.row_top - lowest, 0)
+        out[:, 4:] = np.where(inside, free / SCREEN_HEIGHT, 0.0)
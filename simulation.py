@@ -0,0 +1,211 @@
+import random
+import numpy as np
+
+from collision import SweepIndex
+
+
+SCREEN_WIDTH, SCREEN_HEIGHT = 720, 720
+MAX_ENEMIES = 6
+
+PLAYER_SIZE = 30
+PLAYER_GAP = 5
+PLAYER_SPEED = 15
+
+ENEMY_SIZE = 30
+ENEMY_MAX_SPEED = 25
+
+
+# ---------------- Enemy timeline ---------------- #
+# Enemies never react to players, so their whole trajectory is a function of
+# a seed. The tape stores it as int16 (frame, enemy, x/y/speed): row 0 is the
+# spawn state and row f + 1 the state after the enemies moved in frame f.
+# It grows in chunks on demand, continuing the same RNG, so a tape handed to
+# several evaluators (or saved and reloaded) always replays the same episode.
+TAPE_CHUNK = 1024
+
+
+class EnemyTape:
+    def __init__(self, seed, n_frames=0, n_enemies=MAX_ENEMIES, border_thickness=20, initial_speed=10):
+        self.seed = seed
+        self.n_enemies = n_enemies
+        self.border_thickness = border_thickness
+        self.initial_speed = initial_speed
+        self.rng = random.Random(seed)
+
+        # Spawned exactly like Enemy.__init__
+        self.states = np.zeros((1, n_enemies, 3), dtype=np.int16)
+        self.states[0, :, 0] = [self._respawn_x() for _ in range(n_enemies)]
+        self.states[0, :, 2] = initial_speed
+        self.extend_to(n_frames)
+
+    @property
+    def n_frames(self):
+        return len(self.states) - 1
+
+    def _respawn_x(self):
+        return self.rng.randint(self.border_thickness, SCREEN_WIDTH - self.border_thickness - ENEMY_SIZE)
+
+    def extend_to(self, n_frames):
+        if n_frames <= self.n_frames:
+            return
+        start = self.n_frames
+        count = max(n_frames - start, TAPE_CHUNK)
+        chunk = np.empty((count, self.n_enemies, 3), dtype=np.int16)
+
+        x = self.states[-1, :, 0].astype(np.int64)
+        y = self.states[-1, :, 1].astype(np.int64)
+        limit = SCREEN_HEIGHT - self.border_thickness - ENEMY_SIZE
+        for f in range(count):
+            # Same as Enemy.move, with the speed ramp applied by the game loop
+            speed = min(ENEMY_MAX_SPEED, self.initial_speed + (start + f) // 300)
+            y += speed
+            for i in np.flatnonzero(y > limit):
+                y[i] = 0
+                x[i] = self._respawn_x()
+            chunk[f, :, 0] = x
+            chunk[f, :, 1] = y
+            chunk[f, :, 2] = speed
+
+        self.states = np.concatenate([self.states, chunk])
+
+    def frame(self, f):
+        # Enemy state players see in frame f (after that frame's move)
+        self.extend_to(f + 1)
+        return self.states[f + 1]
+
+    def save(self, path):
+        version, internal, gauss = self.rng.getstate()
+        np.savez_compressed(path, states=self.states, rng_state=np.array(internal, dtype=np.int64),
+                            header=np.array([self.seed, self.border_thickness, self.initial_speed, version],
+                                            dtype=np.int64))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        seed, border_thickness, initial_speed, version = data["header"].tolist()
+        tape = cls.__new__(cls)
+        tape.seed = seed
+        tape.states = data["states"]
+        tape.n_enemies = tape.states.shape[1]
+        tape.border_thickness = border_thickness
+        tape.initial_speed = initial_speed
+        tape.rng = random.Random()
+        tape.rng.setstate((version, tuple(data["rng_state"].tolist()), None))
+        return tape
+
+
+# ---------------- Struct-of-arrays world state ---------------- #
+def observation_size(n_enemies):
+    # [x, y] followed by (rel_x, rel_y, vel_y) per enemy
+    return 2 + 3 * n_enemies
+
+
+def spawn_players(n_players, border_thickness=20, rng=random):
+    # Player x positions, drawn exactly like Player.__init__
+    return np.array([
+        rng.randint(border_thickness + PLAYER_GAP,
+                    SCREEN_WIDTH - border_thickness - PLAYER_SIZE - PLAYER_GAP)
+        for _ in range(n_players)
+    ], dtype=np.int64)
+
+
+# Same rules as the Player / Enemy classes in main.py, but every player
+# lives in a NumPy array so a frame is a handful of vector operations instead
+# of one Python object walk per player. Enemies are read from EnemyTapes.
+#
+# A world can hold several independent episodes (one tape each) stepped
+# together: player row r plays episode r // n_players, so K episodes of the
+# same population are K blocks of rows. Enemy arrays are (episode, enemy).
+class World:
+    def __init__(self, n_players, tapes, rng=random, player_x=None):
+        if isinstance(tapes, EnemyTape):
+            tapes = [tapes]
+        self.tapes = tapes
+        self.n_episodes = len(tapes)
+        self.border_thickness = border_thickness = tapes[0].border_thickness
+        self.survival_time = 0
+
+        # Players; pass player_x (one row per episode) to share spawn
+        # positions between processes
+        if player_x is None:
+            player_x = [spawn_players(n_players, border_thickness, rng) for _ in tapes]
+        self.player_x = np.asarray(player_x, dtype=np.int64).reshape(-1).copy()
+        self.player_y = np.full(len(self.player_x), SCREEN_HEIGHT - border_thickness - PLAYER_SIZE - PLAYER_GAP,
+                                dtype=np.int64)
+        self.episode = np.repeat(np.arange(self.n_episodes), n_players)
+        self.alive = np.ones(len(self.player_x), dtype=bool)
+        self._load_enemies([tape.states[0] for tape in tapes])
+        # Optional extra inputs (sensors.FrameSensors), appended to observations
+        self.sensors = None
+        # Networks decide every decision_interval frames; players repeat
+        # their last outputs in between
+        self.decision_interval = 1
+
+    @property
+    def n_players(self):
+        # Players per episode
+        return len(self.player_x) // self.n_episodes
+
+    @property
+    def n_enemies(self):
+        return self.tapes[0].n_enemies
+
+    def _load_enemies(self, states):
+        states = np.stack(states)
+        self.enemy_x = states[:, :, 0]
+        self.enemy_y = states[:, :, 1]
+        self.enemy_speed = states[:, :, 2]
+
+    def move_enemies(self):
+        self._load_enemies([tape.frame(self.survival_time) for tape in self.tapes])
+
+    def observations(self, rows):
+        # One row per given player: [x, y] then (rel_x, rel_y, vel_y) per
+        # enemy, then the sensor features if sensors are attached
+        px, py, ep = self.player_x[rows], self.player_y[rows], self.episode[rows]
+        n = observation_size(self.n_enemies)
+        size = n + (self.sensors.size if self.sensors is not None else 0)
+        inputs = np.empty((len(rows), size), dtype=np.float64)
+        inputs[:, 0] = px / SCREEN_WIDTH
+        inputs[:, 1] = py / SCREEN_HEIGHT
+        inputs[:, 2:n:3] = (self.enemy_x[ep] - px[:, None]) / SCREEN_WIDTH
+        inputs[:, 3:n:3] = (self.enemy_y[ep] - py[:, None]) / SCREEN_HEIGHT
+        inputs[:, 4:n:3] = self.enemy_speed[ep] / 25.0
+        if self.sensors is not None:
+            self.sensors.features(self, rows, inputs[:, n:])
+        return inputs
+
+    def move_players(self, outputs):
+        # Same thresholds as Player.move_ai, applied to live players only
+        outputs = np.asarray(outputs)
+        step = (outputs[:, 1] > 0.5).astype(np.int64) - (outputs[:, 0] > 0.5).astype(np.int64)
+        self.player_x += np.where(self.alive, step * PLAYER_SPEED, 0)
+
+    def out_of_bounds(self):
+        bt = self.border_thickness
+        return ((self.player_x < bt) |
+                (self.player_x + PLAYER_SIZE > SCREEN_WIDTH - bt) |
+                (self.player_y < bt) |
+                (self.player_y + PLAYER_SIZE > SCREEN_HEIGHT - bt))
+
+    def collisions(self, rows):
+        # pygame.Rect.colliderect of the given players against every enemy of
+        # their episode, through an x-sorted index rebuilt once per frame.
+        # Episodes are laid side by side on x so one index serves them all.
+        offset = 2 * SCREEN_WIDTH * np.arange(self.n_episodes)
+        index = SweepIndex((self.enemy_x + offset[:, None]).reshape(-1), self.enemy_y.reshape(-1),
+                           ENEMY_SIZE, ENEMY_SIZE)
+        return index.overlaps(self.player_x[rows] + offset[self.episode[rows]], self.player_y[rows],
+                              PLAYER_SIZE, PLAYER_SIZE)
+
+    def check_deaths(self):
+        # Returns the players that died this frame and removes them from play
+        dead = self.alive & self.out_of_bounds()
+        rows = np.flatnonzero(self.alive & ~dead)
+        dead[rows[self.collisions(rows)]] = True
+        self.alive &= ~dead
+        return dead
+
+    def tick(self):
+        # Enemy speed ramps up with survival_time (baked into the tape)
+        self.survival_time += 1
@@ -0,0 +1,233 @@
+import json
+import math
+import os
+import time
+from collections import deque
+
+import numpy as np
+import neat
+
+
+# ---------------- Streaming statistics ---------------- #
+# Replaces neat.StatisticsReporter (which keeps every generation's best
+# genome and species fitness for the whole run) and StdOutReporter (which
+# prints a species table every generation). Each generation appends one
+# value to every column of a directory of raw little-endian files:
+#
+#   schema.json                   format version and column dtypes
+#   <column>.bin                  one value per generation
+#   species_<column>.bin          one value per species per generation,
+#                                 split back up with the n_species column
+#
+# A fresh run starts the directory over. A run resumed from a checkpoint
+# at `resume_generation` drops the rows from that generation on, then
+# appends to the same files. Only the last `window` generations' summaries
+# are kept in memory, and the console gets one summary line every
+# `print_interval` seconds at most.
+STATS_FORMAT_VERSION = 1
+
+COLUMNS = {
+    "generation": "<i8",
+    "time": "<f8",
+    "generation_seconds": "<f8",
+    "pop_size": "<i8",
+    "best_fitness": "<f8",
+    "mean_fitness": "<f8",
+    "stdev_fitness": "<f8",
+    "min_fitness": "<f8",
+    "n_species": "<i8",
+    "mean_nodes": "<f8",
+    "mean_connections": "<f8",
+    "max_nodes": "<i8",
+    "max_connections": "<i8",
+    "best_nodes": "<i8",
+    "best_connections": "<i8",
+}
+SPECIES_COLUMNS = {
+    "species_key": "<i8",
+    "species_size": "<i8",
+    "species_mean_fitness": "<f8",
+}
+
+
+def genome_complexity(genomes):
+    # (nodes, enabled connections) per genome, like DefaultGenome.size()
+    nodes = np.fromiter((len(g.nodes) for g in genomes), dtype=np.int64, count=len(genomes))
+    connections = np.fromiter((sum(1 for c in g.connections.values() if c.enabled) for g in genomes),
+                              dtype=np.int64, count=len(genomes))
+    return nodes, connections
+
+
+class StreamingStatsReporter(neat.reporting.BaseReporter):
+    def __init__(self, directory="stats", window=100, print_interval=5.0, flush_every=10,
+                 resume_generation=None, best_genome=None, best_fitness=None):
+        self.directory = directory
+        self.window = deque(maxlen=window)
+        self.print_interval = print_interval
+        self.flush_every = flush_every
+        # A resumed run starts from the checkpoint's overall best
+        self.best_genome = best_genome
+        self.best_fitness = best_fitness
+
+        os.makedirs(directory, exist_ok=True)
+        schema_path = os.path.join(directory, "schema.json")
+        schema = {"version": STATS_FORMAT_VERSION, "columns": COLUMNS, "species_columns": SPECIES_COLUMNS}
+        resuming = resume_generation is not None and os.path.exists(schema_path)
+        if resuming:
+            with open(schema_path) as f:
+                if json.load(f) != schema:
+                    raise ValueError(f"{directory}: statistics written in a different format")
+            truncate_stats(directory, resume_generation)
+        else:
+            with open(schema_path, "w") as f:
+                json.dump(schema, f, indent=2)
+        self.files = {name: open(os.path.join(directory, name + ".bin"), "ab" if resuming else "wb")
+                      for name in list(COLUMNS) + list(SPECIES_COLUMNS)}
+
+        self.generation = None
+        self.generation_start = None
+        self.pending = None
+        self.rows_unflushed = 0
+        self.last_print = None
+        self.stagnant = 0
+
+    def start_generation(self, generation):
+        self.generation = generation
+        self.generation_start = time.perf_counter()
+
+    def post_evaluate(self, config, population, species, best_genome):
+        genomes = list(population.values())
+        fitness = np.array([g.fitness for g in genomes], dtype=np.float64)
+        nodes, connections = genome_complexity(genomes)
+        best_nodes, best_connections = best_genome.size()
+        # Elites are re-evaluated, so the best fitness is kept apart from the genome
+        if self.best_fitness is None or best_genome.fitness > self.best_fitness:
+            self.best_genome, self.best_fitness = best_genome, best_genome.fitness
+
+        keys = sorted(species.species)
+        members = [species.species[key].members for key in keys]
+        species_fitness = [float(np.mean([g.fitness for g in m.values()])) if m else math.nan for m in members]
+
+        self.pending = {
+            "generation": self.generation,
+            "pop_size": len(genomes),
+            "best_fitness": float(fitness.max()),
+            "mean_fitness": float(fitness.mean()),
+            "stdev_fitness": float(fitness.std()),
+            "min_fitness": float(fitness.min()),
+            "n_species": len(keys),
+            "mean_nodes": float(nodes.mean()),
+            "mean_connections": float(connections.mean()),
+            "max_nodes": int(nodes.max()),
+            "max_connections": int(connections.max()),
+            "best_nodes": best_nodes,
+            "best_connections": best_connections,
+            "species_key": keys,
+            "species_size": [len(m) for m in members],
+            "species_mean_fitness": species_fitness,
+        }
+
+    def end_generation(self, config, population, species_set):
+        self._finish_generation()
+
+    def found_solution(self, config, generation, best):
+        # Population.run stops before end_generation in this case
+        self._finish_generation()
+        self._print_summary(force=True)
+        print(f"Best individual in generation {generation} meets fitness threshold - "
+              f"complexity: {best.size()!r}")
+        self.flush()
+
+    def complete_extinction(self):
+        print("All species extinct.")
+
+    def species_stagnant(self, sid, species):
+        # Counted and reported with the next summary line; NEAT's per-generation
+        # info() messages are not printed at all
+        self.stagnant += 1
+
+    def _finish_generation(self):
+        if self.pending is None:
+            return
+        row, self.pending = self.pending, None
+        row["time"] = time.time()
+        row["generation_seconds"] = time.perf_counter() - self.generation_start
+
+        for name, dtype in COLUMNS.items():
+            self.files[name].write(np.array([row[name]], dtype=dtype).tobytes())
+        for name, dtype in SPECIES_COLUMNS.items():
+            self.files[name].write(np.array(row[name], dtype=dtype).tobytes())
+        self.rows_unflushed += 1
+        if self.rows_unflushed >= self.flush_every:
+            self.flush()
+
+        self.window.append({name: row[name] for name in COLUMNS})
+        self._print_summary()
+
+    def _print_summary(self, force=False):
+        now = time.perf_counter()
+        if not self.window or (not force and self.last_print is not None
+                               and now - self.last_print < self.print_interval):
+            return
+        self.last_print = now
+        row = self.window[-1]
+        seconds = np.mean([r["generation_seconds"] for r in self.window])
+        line = (f"Gen {row['generation']}: best {row['best_fitness']:.3f} "
+                f"(overall {self.best_fitness:.3f}), mean {row['mean_fitness']:.3f} "
+                f"+/- {row['stdev_fitness']:.3f}, {row['n_species']} species, "
+                f"{row['mean_nodes']:.1f} nodes / {row['mean_connections']:.1f} connections, "
+                f"{seconds:.3f} s/gen over the last {len(self.window)}")
+        if self.stagnant:
+            line += f", {self.stagnant} species removed as stagnant"
+            self.stagnant = 0
+        print(line)
+
+    def flush(self):
+        for f in self.files.values():
+            f.flush()
+        self.rows_unflushed = 0
+
+    def close(self):
+        self._finish_generation()
+        for f in self.files.values():
+            f.close()
+
+
+def load_stats(directory):
+    # Returns (columns, species): a dict of per-generation arrays, and a list
+    # with a dict of per-species arrays for every generation. A run that died
+    # mid-write may have some columns one generation longer than the rest;
+    # the extra values are dropped.
+    with open(os.path.join(directory, "schema.json")) as f:
+        schema = json.load(f)
+    if schema["version"] != STATS_FORMAT_VERSION:
+        raise ValueError(f"{directory}: unsupported statistics version {schema['version']}")
+
+    columns = {name: np.fromfile(os.path.join(directory, name + ".bin"), dtype=dtype)
+               for name, dtype in schema["columns"].items()}
+    per_species = {name: np.fromfile(os.path.join(directory, name + ".bin"), dtype=dtype)
+                   for name, dtype in schema["species_columns"].items()}
+    n = min(len(values) for values in columns.values())
+    bounds = np.cumsum(columns["n_species"][:n])
+    n = int(np.searchsorted(bounds, min(len(values) for values in per_species.values()), side="right"))
+
+    columns = {name: values[:n] for name, values in columns.items()}
+    bounds = bounds[:n]
+    end = int(bounds[-1]) if n else 0
+    species = [{} for _ in range(n)]
+    for name, values in per_species.items():
+        for g, part in enumerate(np.split(values[:end], bounds[:-1])[:n]):
+            species[g][name] = part
+    return columns, species
+
+
+def truncate_stats(directory, generation):
+    # Drops every row from `generation` on, and any partial write, so a run
+    # resumed from an older checkpoint does not repeat generations
+    columns, species = load_stats(directory)
+    n = int(np.searchsorted(columns["generation"], generation))
+    n_species = int(columns["n_species"][:n].sum())
+    for name, dtype in COLUMNS.items():
+        os.truncate(os.path.join(directory, name + ".bin"), n * np.dtype(dtype).itemsize)
+    for name, dtype in SPECIES_COLUMNS.items():
+        os.truncate(os.path.join(directory, name + ".bin"), n_species * np.dtype(dtype).itemsize)